@@ -5,11 +5,36 @@ import pandas as pd
 import os
 import sys
 import logging
+import argparse
+import copy
+import codecs
+import csv
+import functools
+import hashlib
+import importlib.util
+import io
+import itertools
+import heapq
+import math
+import pickle
+import random
+import re
+import signal
+import socket
+import socketserver
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
 import concurrent.futures
+import contextlib
 import matplotlib.pyplot as plt
 import seaborn as sns
 import warnings
 import numpy as np
+from collections import Counter
+from stat import S_ISSOCK
 
 DEBUG = False
 
@@ -24,90 +49,931 @@ logging.basicConfig(
 )
 
 
-class Analysis:
-    def __init__(self):
-        self.results = []
-        self.dataset_count = 0
+CHUNK_SIZE = 10000
+ENCODINGS_TO_TRY = ["utf-8", "ISO-8859-1", "Windows-1252"]
+SNIFF_BYTES = 64 * 1024
+HASH_BLOCK_SIZE = 1024 * 1024
+JSON_BLOCK_SIZE = 1024 * 1024
 
-    def check_missing_values(self, df):
-        missing_values = df.isnull().sum().sum()
-        total_values = df.size
-        return {
-            "check": "Missing Values",
-            "count": int(missing_values),
-            "total": int(total_values),
-            "percentage": (
-                float((missing_values / total_values) * 100) if total_values else 0.0
+# Bump when a check or the way files are parsed changes, so cached results
+# computed by an older version are not served anymore.
+CHECKS_VERSION = 4
+RESULT_CACHE_DIR = ".analysis_cache"
+RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# Parsed copies of the source files; bump the version when the parsing
+# options change so older copies are re-parsed. Copies of deleted or changed
+# files and, past the size bound, the least recently read ones are evicted.
+PARSED_CACHE_DIR = ".parsed_cache"
+PARSED_CACHE_VERSION = 4
+PARSED_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+# Partial report of one shard of a sharded run; bump the version when its
+# layout changes.
+PARTIAL_REPORT_PATH = "partial_report_{}_of_{}.jsonl"
+PARTIAL_REPORT_VERSION = 1
+# The umask can only be read by setting it, so it is read once here rather
+# than while worker threads create files.
+UMASK = os.umask(0)
+os.umask(UMASK)
+# Watch mode: seconds between two polls of the data info and dataset files and
+# the local socket the daemon answers on.
+WATCH_INTERVAL = 5
+DAEMON_SOCKET_PATH = ".analysis.sock"
+DELIMITERS = ",;\t|"
+# Sampling mode: absolute error target of the sampled percentages and the
+# confidence of their intervals. CSV rows are thinned while parsing to about
+# SAMPLE_OVERSAMPLING times the sample size before the reservoir draw.
+SAMPLE_ERROR = 0.01
+SAMPLE_CONFIDENCE = 0.95
+SAMPLE_OVERSAMPLING = 2
+# CSV parser; "auto" reads files up to ARROW_MAX_FILE_BYTES with Arrow, which
+# holds the whole file, and larger ones in chunks with pandas.
+CSV_BACKEND = "auto"
+ARROW_MAX_FILE_BYTES = 64 * 1024 * 1024
+# Default na_values, true_values and false_values of pandas.read_csv, given
+# to the Arrow parser so both backends agree on missing values and booleans.
+PANDAS_NA_VALUES = [
+    "",
+    "#N/A",
+    "#N/A N/A",
+    "#NA",
+    "-1.#IND",
+    "-1.#QNAN",
+    "-NaN",
+    "-nan",
+    "1.#IND",
+    "1.#QNAN",
+    "<NA>",
+    "N/A",
+    "NA",
+    "NULL",
+    "NaN",
+    "None",
+    "n/a",
+    "nan",
+    "null",
+]
+PANDAS_TRUE_VALUES = ["True", "TRUE", "true"]
+PANDAS_FALSE_VALUES = ["False", "FALSE", "false"]
+# Memory admission: rows parsed to measure the bytes per row of a file, the
+# working memory of a chunk relative to its DataFrame (null mask, non-null
+# column copies, type classification) and the in-memory size relative to the
+# file size of a whole file (Arrow table, parsed json or xlsx).
+ESTIMATE_ROWS = 1000
+CHUNK_MEMORY_FACTOR = 3
+WHOLE_FILE_MEMORY_FACTORS = {".csv": 1.5, ".json": 5, ".xlsx": 10}
+MIN_CHUNK_SIZE = 1000
+
+BOOLEAN_VALUES = ["true", "false", "yes", "no", "ja", "nein"]
+DATE_PATTERN = (
+    r"^(\d{4}-\d{1,2}-\d{1,2}([ T]\d{1,2}:\d{2}(:\d{2})?)?"
+    r"|\d{1,2}\.\d{1,2}\.\d{2,4}"
+    r"|\d{1,2}/\d{1,2}/\d{4})$"
+)
+
+
+def percentage_of(count, total):
+    return float((count / total) * 100) if total else 0.0
+
+
+def peak_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def current_rss_bytes():
+    # Resident set size right now (Linux only, None elsewhere)
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+# Wall time per phase of one dataset (loading chunks, shared intermediates,
+# every check), the rows and cells seen and which encoding worked. The RSS
+# growth is the resident memory at the end of the dataset less the one at its
+# start; the peak RSS is the highest of the whole process so far. With
+# trace_memory the tracemalloc peak while the dataset was analyzed is added.
+# The growth and the traced peak are only meaningful when datasets are not
+# analyzed concurrently in one process.
+class DatasetMetrics:
+    def __init__(self, trace_memory=False):
+        self.phases = {}
+        self.rows = 0
+        self.cells = 0
+        self.encoding = None
+        self.encoding_attempts = 0
+        self.cached = False
+        self.trace_memory = trace_memory
+        self.started = time.time()
+        self.start = time.perf_counter()
+        self.start_rss = current_rss_bytes()
+        if trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            getattr(tracemalloc, "reset_peak", tracemalloc.clear_traces)()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def as_dict(self):
+        wall_seconds = time.perf_counter() - self.start
+        rss = current_rss_bytes()
+        metrics = {
+            "started": self.started,
+            "wall_seconds": wall_seconds,
+            "phases": self.phases,
+            "rows": self.rows,
+            "cells": self.cells,
+            "rows_per_second": self.rows / wall_seconds if wall_seconds else None,
+            "cells_per_second": self.cells / wall_seconds if wall_seconds else None,
+            "encoding": self.encoding,
+            "encoding_attempts": self.encoding_attempts,
+            "cached": self.cached,
+            "rss_bytes": rss,
+            "rss_growth_bytes": (
+                rss - self.start_rss
+                if rss is not None and self.start_rss is not None
+                else None
             ),
-            # 'count': missing_values,
-            # 'total': total_values,
-            # 'percentage': (missing_values / total_values) * 100 if total_values else 0
+            "process_peak_rss_bytes": peak_rss_bytes(),
+            "pid": os.getpid(),
+            "thread": threading.get_ident(),
         }
+        if self.trace_memory:
+            metrics["peak_traced_bytes"] = tracemalloc.get_traced_memory()[1]
+        return metrics
 
-    def check_null_values(self, df):
-        null_values = df.isna().sum().sum()
-        total_values = df.size
+
+# Intermediates are values derived from a chunk that several checks need
+# (null mask, dtypes, first column, ...). Each one is registered with the
+# intermediates it is built from and computed at most once per chunk. A check
+# can ask for a parameterized intermediate with a tuple (name, *params), which
+# is computed once per distinct set of parameters.
+INTERMEDIATES = {}
+
+
+def intermediate(name, requires=()):
+    def register(func):
+        INTERMEDIATES[name] = (tuple(requires), func)
+        return func
+
+    return register
+
+
+def step_name(step):
+    return step[0] if isinstance(step, tuple) else step
+
+
+def step_params(step):
+    return step[1:] if isinstance(step, tuple) else ()
+
+
+@intermediate("size")
+def compute_size(df, values):
+    return df.size
+
+
+@intermediate("row_count")
+def compute_row_count(df, values):
+    return len(df)
+
+
+@intermediate("null_mask")
+def compute_null_mask(df, values):
+    return df.isna().to_numpy()
+
+
+@intermediate("null_count", requires=["null_mask"])
+def compute_null_count(df, values):
+    return int(values["null_mask"].sum())
+
+
+@intermediate("non_null_columns", requires=["null_mask"])
+def compute_non_null_columns(df, values):
+    null_mask = values["null_mask"]
+    return [
+        df.iloc[:, position][~null_mask[:, position]] for position in range(df.shape[1])
+    ]
+
+
+def hash_identifier_column(column):
+    # Numbers are hashed as float64 so that an id read as int64 in one chunk
+    # and as float64 in another (because of a missing value) hashes the same.
+    if pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column):
+        column = column.astype("float64")
+    return pd.util.hash_pandas_object(column, index=False).to_numpy(dtype=np.uint64)
+
+
+@intermediate("identifier_hashes")
+def compute_identifier_hashes(df, values, key_columns):
+    # One 64-bit hash per row whose key columns are all present, combined
+    # column by column for composite keys. Rows with a missing key part are
+    # not identifiers and are left out, like nunique leaves out NaN.
+    columns = values["columns"]
+    positions = [
+        position if columns is None else columns.index(position)
+        for position in key_columns
+    ]
+    keys = df.iloc[:, positions]
+    keys = keys[keys.notna().all(axis=1).to_numpy()]
+    hashes = np.zeros(len(keys), dtype=np.uint64)
+    for position in range(keys.shape[1]):
+        column_hashes = hash_identifier_column(keys.iloc[:, position])
+        hashes = hashes * np.uint64(1000003) ^ column_hashes
+    return hashes
+
+
+class ExecutionPlan:
+    # Checks are given as accumulator classes or as configured accumulator
+    # instances; every analyzed file gets fresh copies of them.
+    def __init__(self, checks):
+        self.checks = [
+            check() if isinstance(check, type) else check for check in checks
+        ]
+        self.steps = []
+        for check in self.checks:
+            for step in check.requires:
+                self.add_step(step)
+
+    @property
+    def columns(self):
+        # Union of the column positions the checks read, None for all columns.
+        # Positions are kept sorted so the first column stays in front.
+        columns = set()
+        for check in self.checks:
+            if check.columns is None:
+                return None
+            columns.update(check.columns)
+        return sorted(columns) if columns else None
+
+    def add_step(self, step):
+        if step in self.steps:
+            return
+        requires, _ = INTERMEDIATES[step_name(step)]
+        for dependency in requires:
+            self.add_step(dependency)
+        self.steps.append(step)
+
+    def compute(self, df):
+        # Chunks are usually read with only the plan's columns; a full frame
+        # (e.g. passed to analyze) is narrowed here, so the positions of the
+        # intermediates always refer to the plan's columns.
+        columns = self.columns
+        if columns is not None and df.shape[1] != len(columns):
+            df = df.iloc[:, columns]
+        values = {"columns": columns}
+        for step in self.steps:
+            values[step] = INTERMEDIATES[step_name(step)][1](
+                df, values, *step_params(step)
+            )
+        return values
+
+    def create_accumulators(self):
+        return [copy.deepcopy(check) for check in self.checks]
+
+    def run(self, chunks, metrics=None):
+        metrics = metrics or DatasetMetrics()
+        accumulators = self.create_accumulators()
+        chunks = iter(chunks)
+        while True:
+            with metrics.phase("load"):
+                chunk = next(chunks, None)
+            if chunk is None:
+                break
+            metrics.rows += len(chunk)
+            metrics.cells += chunk.size
+            with metrics.phase("intermediates"):
+                values = self.compute(chunk)
+            for accumulator in accumulators:
+                with metrics.phase(accumulator.check):
+                    accumulator.update(values)
+        results = []
+        for accumulator in accumulators:
+            with metrics.phase(accumulator.check):
+                results.append(accumulator.result())
+        return results
+
+
+CHECKS = []
+
+
+def register_check(accumulator_class):
+    CHECKS.append(accumulator_class)
+    return accumulator_class
+
+
+# Every check keeps partial state (counters, distinct values) that is updated
+# one chunk at a time and can be merged with the state of another chunk, so a
+# file never has to be materialized as a single DataFrame. Checks only read
+# the intermediates listed in `requires`, never the chunk itself.
+class CheckAccumulator:
+    check = None
+    key = None
+    requires = ()
+    columns = None
+    # Whether the check's percentage can be estimated from a row sample
+    sampleable = True
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+
+    def options(self):
+        return {}
+
+    def state_bytes(self, rows):
+        # Memory the check keeps across chunks for a file of `rows` rows
+        return 0
+
+    def update(self, values):
+        raise NotImplementedError
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        return self
+
+    def result(self):
         return {
-            "check": "Null Values",
-            "count": int(null_values),
-            "total": int(total_values),
-            "percentage": (
-                float((null_values / total_values) * 100) if total_values else 0.0
-            ),
-            # 'count': null_values,
-            # 'total': total_values,
-            # 'percentage': (null_values / total_values) * 100 if total_values else 0
+            "check": self.check,
+            "count": int(self.count),
+            "total": int(self.total),
+            "percentage": percentage_of(self.count, self.total),
         }
 
-    def check_data_types(self, df):
-        invalid_data_count = 0
-        total_values = df.size
-        for col, col_type in df.dtypes.items():
-            try:
-                invalid_data_count += (
-                    ~df[col].apply(pd.api.types.is_dtype_equal, args=(col_type,))
-                ).sum()
-            except:
-                invalid_data_count += len(df)
+
+@register_check
+class MissingValuesAccumulator(CheckAccumulator):
+    check = "Missing Values"
+    key = "missing_values"
+    requires = ("null_count", "size")
+
+    def update(self, values):
+        self.count += values["null_count"]
+        self.total += values["size"]
+
+
+@register_check
+class NullValuesAccumulator(CheckAccumulator):
+    check = "Null Values"
+    key = "null_values"
+    requires = ("null_count", "size")
+
+    def update(self, values):
+        self.count += values["null_count"]
+        self.total += values["size"]
+
+
+def dtype_value_type(dtype):
+    if pd.api.types.is_bool_dtype(dtype):
+        return "boolean"
+    if pd.api.types.is_numeric_dtype(dtype):
+        return "numeric"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "date"
+    return None
+
+
+def classify_values(values):
+    # Classify each distinct value once and weight it by how often it occurs;
+    # the open data columns repeat a small set of values many times.
+    counts = values.astype(str).str.strip().value_counts()
+    labels = pd.Series(counts.index)
+    is_boolean = labels.str.lower().isin(BOOLEAN_VALUES).to_numpy()
+    is_numeric = pd.to_numeric(labels, errors="coerce").notna().to_numpy()
+    is_date = labels.str.match(DATE_PATTERN).to_numpy(dtype=bool)
+    value_types = np.select(
+        [is_boolean, is_numeric, is_date], ["boolean", "numeric", "date"], "string"
+    )
+    return counts.groupby(value_types).sum().to_dict()
+
+
+@register_check
+class DataTypesAccumulator(CheckAccumulator):
+    check = "Invalid Data Types"
+    key = "invalid_data_types"
+    requires = ("non_null_columns", "size")
+
+    # A value is invalid when its inferred type (numeric, date, boolean,
+    # string) differs from the most common type of its column. Typed columns
+    # are valid as a whole, object columns are classified value by value.
+    def __init__(self):
+        super().__init__()
+        self.type_counts = {}
+
+    def update(self, values):
+        for position, column in enumerate(values["non_null_columns"]):
+            value_type = dtype_value_type(column.dtype)
+            if value_type:
+                counts = {value_type: len(column)}
+            else:
+                counts = classify_values(column)
+            self.type_counts.setdefault(position, Counter()).update(counts)
+        self.total += values["size"]
+
+    def merge(self, other):
+        for position, counts in other.type_counts.items():
+            self.type_counts.setdefault(position, Counter()).update(counts)
+        self.total += other.total
+        return self
+
+    def result(self):
+        self.count = sum(
+            sum(counts.values()) - max(counts.values(), default=0)
+            for counts in self.type_counts.values()
+        )
+        return super().result()
+
+
+class HashSet64:
+    # Exact set of 64-bit hashes kept as a sorted numpy array (8 bytes per
+    # distinct value). New hashes are buffered and folded in once the buffer
+    # is as large as the set, which keeps insertion amortized O(n log n).
+    def __init__(self):
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.pending = []
+        self.pending_size = 0
+
+    def add(self, hashes):
+        self.pending.append(hashes)
+        self.pending_size += len(hashes)
+        if self.pending_size > max(len(self.hashes), 1 << 16):
+            self.consolidate()
+
+    def consolidate(self):
+        if self.pending:
+            hashes = np.concatenate([self.hashes] + self.pending)
+            hashes.sort()
+            distinct = np.ones(len(hashes), dtype=bool)
+            distinct[1:] = hashes[1:] != hashes[:-1]
+            self.hashes = hashes[distinct]
+            self.pending = []
+            self.pending_size = 0
+
+    def merge(self, other):
+        other.consolidate()
+        self.add(other.hashes)
+
+    def __len__(self):
+        self.consolidate()
+        return len(self.hashes)
+
+
+class HyperLogLog:
+    # HyperLogLog sketch over 64-bit hashes with 2**precision registers; the
+    # relative standard error of the estimate is about 1.04 / sqrt(2**precision).
+    def __init__(self, error=0.01):
+        self.precision = min(max(math.ceil(math.log2((1.04 / error) ** 2)), 4), 18)
+        self.registers = np.zeros(1 << self.precision, dtype=np.uint8)
+
+    def add(self, hashes):
+        if not len(hashes):
+            return
+        value_bits = 64 - self.precision
+        indexes = (hashes >> np.uint64(value_bits)).astype(np.intp)
+        remainders = hashes & np.uint64((1 << value_bits) - 1)
+        ranks = (value_bits - bit_length(remainders) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, indexes, ranks)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def __len__(self):
+        m = len(self.registers)
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(int)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+def bit_length(values):
+    # Number of significant bits of each uint64, computed on the two 32-bit
+    # halves so every step is exact in float64.
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1])
+
+
+UNIQUE_MODES = ["exact", "hll"]
+
+
+@register_check
+class UniqueIdentifierAccumulator(CheckAccumulator):
+    check = "Unique Identifier Check"
+    key = "unique_identifier_check"
+    # Duplicates in a sample do not scale to the file; in sampling mode the
+    # identifier columns are still read in full.
+    sampleable = False
+
+    # The identifier is the first column unless key_columns names a composite
+    # key. "exact" keeps every distinct hash, "hll" estimates the distinct
+    # count within the given relative error in a few KiB of memory.
+    def __init__(self, mode="exact", error=0.01, key_columns=(0,)):
+        super().__init__()
+        self.mode = mode
+        self.error = error
+        self.key_columns = tuple(key_columns)
+        self.requires = (("identifier_hashes", self.key_columns), "row_count")
+        self.columns = sorted(set(self.key_columns))
+        self.distinct = HyperLogLog(error) if mode == "hll" else HashSet64()
+
+    def options(self):
+        options = {"mode": self.mode, "key_columns": list(self.key_columns)}
+        if self.mode == "hll":
+            options["error"] = self.error
+        return options
+
+    def state_bytes(self, rows):
+        if self.mode == "hll":
+            return len(self.distinct.registers)
+        # 8 bytes per hash, twice while the set and its buffer are merged
+        return 16 * rows
+
+    def update(self, values):
+        self.distinct.add(values[("identifier_hashes", self.key_columns)])
+        self.total += values["row_count"]
+
+    def merge(self, other):
+        self.distinct.merge(other.distinct)
+        self.total += other.total
+        return self
+
+    def result(self):
+        self.count = self.total - min(len(self.distinct), self.total)
+        return super().result()
+
+
+# Order of the entries in the combined summary report.
+COMBINED_SUMMARY_KEYS = {
+    check.check: check.key
+    for check in [
+        NullValuesAccumulator,
+        DataTypesAccumulator,
+        MissingValuesAccumulator,
+        UniqueIdentifierAccumulator,
+    ]
+}
+
+
+# Row sampling inside every file and optional file level sampling across the
+# corpus. The rows per file are sized so that a percentage near 50%, the worst
+# case, is within `error` at the given confidence; a file with fewer rows is
+# analyzed completely.
+class Sampling:
+    def __init__(
+        self,
+        error=SAMPLE_ERROR,
+        confidence=SAMPLE_CONFIDENCE,
+        rows=None,
+        files=None,
+        seed=0,
+    ):
+        self.error = error
+        self.confidence = confidence
+        self.z = statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+        self.rows = rows or math.ceil((self.z / (2 * error)) ** 2)
+        self.files = files
+        self.seed = seed
+
+    def options(self):
+        return {"rows": self.rows, "confidence": self.confidence, "seed": self.seed}
+
+    def file_seed(self, file_name):
+        # Same sample of a file on every run with the same seed
+        key = f"{self.seed}:{os.path.abspath(file_name)}".encode()
+        return int.from_bytes(hashlib.sha256(key).digest()[:8], "little")
+
+    def select_datasets(self, datasets):
+        # Stratified by file size: the files are sorted by size, cut into as
+        # many equal strata as files to keep and one file is drawn from each.
+        if not self.files or self.files >= 1:
+            return datasets
+        count = max(1, math.ceil(len(datasets) * self.files))
+        order = sorted(
+            range(len(datasets)), key=lambda index: dataset_file_size(datasets[index])
+        )
+        bounds = np.linspace(0, len(datasets), count + 1).astype(int)
+        rng = random.Random(self.seed)
+        selected = [
+            order[rng.randrange(low, high)]
+            for low, high in zip(bounds[:-1], bounds[1:])
+            if high > low
+        ]
+        return [datasets[index] for index in sorted(selected)]
+
+
+def proportion_interval(p, n, population, z):
+    # Wilson score interval for a proportion measured on n of population
+    # rows, narrowed by the finite population correction. Cell based checks
+    # count several cells per row; treating the row as the sampling unit keeps
+    # the interval conservative. Returns (low, high, standard error).
+    if n >= population:
+        return p, p, 0.0
+    fpc = math.sqrt((population - n) / (population - 1))
+    denominator = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denominator
+    half_width = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    half_width *= fpc
+    return max(center - half_width, 0.0), min(center + half_width, 1.0), half_width / z
+
+
+def sampled_result(result, sample_rows, population_rows, sampling):
+    # Count and total are scaled up to the whole file so the combined report
+    # weights every file by its size; the measured values are kept as well.
+    if not sample_rows or not result["total"]:
+        return result
+    p = result["count"] / result["total"]
+    total = int(round(result["total"] * population_rows / sample_rows))
+    count = int(round(p * total))
+    low, high, standard_error = proportion_interval(
+        p, sample_rows, population_rows, sampling.z
+    )
+    return dict(
+        result,
+        count=count,
+        total=total,
+        percentage=p * 100,
+        sample={
+            "rows": sample_rows,
+            "population_rows": population_rows,
+            "count": result["count"],
+            "total": result["total"],
+            "confidence": sampling.confidence,
+            "confidence_interval": [low * 100, high * 100],
+            "standard_error": standard_error * 100,
+        },
+    )
+
+
+# Uniform sample without replacement of a fixed number of rows from a stream
+# of chunks: every row gets a random key and the rows with the smallest keys
+# are kept, so memory stays at the sample plus one chunk.
+class Reservoir:
+    def __init__(self, size, seed=None):
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.sample = None
+        self.keys = np.empty(0)
+        self.rows_seen = 0
+
+    def add(self, chunk):
+        self.rows_seen += len(chunk)
+        keys = self.rng.random(len(chunk))
+        if self.sample is not None:
+            chunk = pd.concat([self.sample, chunk])
+            keys = np.concatenate([self.keys, keys])
+        if len(chunk) > self.size:
+            keep = np.sort(np.argpartition(keys, self.size)[: self.size])
+            chunk = chunk.iloc[keep]
+            keys = keys[keep]
+        self.sample = chunk
+        self.keys = keys
+
+
+# skiprows callable for read_csv that keeps each line with probability rate
+# (the first line is always kept, it may be the header) and counts the lines.
+# Skipped lines are tokenized but never converted, which is most of the cost.
+class RowThinner:
+    def __init__(self, rate, seed=None):
+        self.rate = rate
+        self.random = random.Random(seed).random
+        self.lines = 0
+
+    def __call__(self, index):
+        self.lines = max(self.lines, index + 1)
+        return index > 0 and self.random() >= self.rate
+
+
+# Running count/total sums per check, updated one report at a time so the
+# combined report never needs the individual reports in memory. In sampling
+# mode the sums needed for the confidence intervals are kept as well.
+class CombinedSummary:
+    def __init__(self, sampling=None, population_count=None):
+        self.dataset_count = 0
+        self.sums = {}
+        self.sampling = sampling
+        self.population_count = population_count
+        self.file_sums = {"count": 0, "total": 0, "total_squared": 0}
+
+    def add(self, report, weight=1):
+        # A weight of -1 takes a report out again (in watch mode, when its
+        # dataset changed); checks without results left are dropped.
+        self.dataset_count += weight
+        report_total = sum(result["total"] for result in report["analysis_results"])
+        if report["analysis_results"]:
+            self.file_sums["count"] += weight
+            self.file_sums["total"] += weight * report_total
+            self.file_sums["total_squared"] += weight * report_total**2
+        for result in report["analysis_results"]:
+            sums = self.sums.setdefault(
+                result["check"],
+                {
+                    "results": 0,
+                    "count": 0,
+                    "total": 0,
+                    "row_variance": 0.0,
+                    "count_squared": 0,
+                    "count_total": 0,
+                },
+            )
+            sums["results"] += weight
+            sums["count"] += weight * result["count"]
+            sums["total"] += weight * result["total"]
+            sums["count_squared"] += weight * result["count"] ** 2
+            sums["count_total"] += weight * result["count"] * report_total
+            if "sample" in result:
+                standard_error = result["sample"]["standard_error"] / 100
+                sums["row_variance"] += weight * (result["total"] * standard_error) ** 2
+            if not sums["results"]:
+                del self.sums[result["check"]]
+
+    def remove(self, report):
+        self.add(report, -1)
+
+    def state(self):
+        # The raw sums, for a partial report of one shard
         return {
-            "check": "Invalid Data Types",
-            "count": int(invalid_data_count),
-            "total": int(total_values),
-            "percentage": (
-                float((invalid_data_count / total_values) * 100)
-                if total_values
-                else 0.0
-            ),
-            # 'count': invalid_data_count,
-            # 'total': total_values,
-            # 'percentage': (invalid_data_count / total_values) * 100 if total_values else 0
+            "dataset_count": self.dataset_count,
+            "sums": self.sums,
+            "file_sums": self.file_sums,
         }
 
+    def merge(self, state):
+        # Adds the sums of another summary's state(); integer sums add up to
+        # exactly what one summary over all the reports would hold.
+        self.dataset_count += state["dataset_count"]
+        for check, sums in state["sums"].items():
+            merged = self.sums.setdefault(check, dict.fromkeys(sums, 0))
+            for name, value in sums.items():
+                merged[name] += value
+        for name, value in state["file_sums"].items():
+            self.file_sums[name] += value
+        return self
+
+    def confidence_interval(self, sums, total_records):
+        # Ratio estimator over the analyzed files: the variance of the row
+        # samples inside the files plus, when only a part of the files was
+        # drawn, the variance between the files.
+        ratio = sums["count"] / total_records
+        variance = sums["row_variance"] / total_records**2
+        files = self.file_sums["count"]
+        population = self.population_count or files
+        if 1 < files < population:
+            squared_deviations = (
+                sums["count_squared"]
+                - 2 * ratio * sums["count_total"]
+                + ratio**2 * self.file_sums["total_squared"]
+            )
+            mean_total = total_records / files
+            variance += (
+                (1 - files / population)
+                * max(squared_deviations, 0)
+                / (files - 1)
+                / files
+                / mean_total**2
+            )
+        half_width = self.sampling.z * math.sqrt(variance)
+        return max(ratio - half_width, 0.0) * 100, min(ratio + half_width, 1.0) * 100
+
+    def report(self, echo=True):
+        # echo=False only builds the report, without printing and logging it
+        out = print if echo else lambda *args: None
+        log = logging.info if echo else lambda *args: None
+        log("--- Final Analysis Report ---")
+        number_of_dataset_analyzed = self.dataset_count
+        out("\n--- Final Analysis Report ---")
+        out(f"Number of datasets analyzed: {number_of_dataset_analyzed}")
+        log(f"Number of datasets analyzed: {number_of_dataset_analyzed}")
+        out("Combined results ")
+
+        # Percentages are taken of the total records over all checks
+        total_records = sum(sums["total"] for sums in self.sums.values())
+        summary = [
+            (
+                check,
+                sums["count"],
+                sums["total"],
+                percentage_of(sums["count"], total_records),
+            )
+            for check, sums in sorted(self.sums.items())
+        ]
+
+        # Create the combined summary dictionary
+        combined_summary = {}
+        percentages = {check: percentage for check, _, _, percentage in summary}
+        for check, key in COMBINED_SUMMARY_KEYS.items():
+            if check in percentages:
+                combined_summary[key] = round(percentages[check], 2)
+
+        # Print and log the combined summary
+        for check, percentage in combined_summary.items():
+            out(f"{check.replace('_', ' ').title()}: {percentage:.2f}%")
+            log(f"{check.replace('_', ' ').title()}: {percentage:.2f}%")
+
+        # Print summary by check type
+        out("\nSummary by check type:")
+        for check, count, total, percentage in summary:
+            out(f"{check}: {percentage:.2f}% ({count}/{total})")
+            log(f"{check}: {percentage:.2f}% ({count}/{total})")
+
+        if self.sampling and total_records:
+            confidence = f"{self.sampling.confidence:.0%}"
+            out(f"\nSampled estimates ({confidence} confidence intervals):")
+            intervals = {}
+            for check, key in COMBINED_SUMMARY_KEYS.items():
+                if check in self.sums:
+                    low, high = self.confidence_interval(
+                        self.sums[check], total_records
+                    )
+                    intervals[key] = [round(low, 2), round(high, 2)]
+                    message = (
+                        f"{check}: {percentages[check]:.2f}% [{low:.2f}% - {high:.2f}%]"
+                    )
+                    out(message)
+                    log(message)
+            combined_summary["confidence"] = self.sampling.confidence
+            combined_summary["confidence_intervals"] = intervals
+
+        return combined_summary
+
+
+class Analysis:
+    def __init__(
+        self,
+        checks=None,
+        parsed_cache_dir=PARSED_CACHE_DIR,
+        trace_memory=False,
+        sampling=None,
+        csv_backend=CSV_BACKEND,
+        chunk_size=CHUNK_SIZE,
+    ):
+        self.results = []
+        self.dataset_count = 0
+        self.checks = list(CHECKS if checks is None else checks)
+        self.plan = ExecutionPlan(self.checks)
+        self.parsed_cache_dir = parsed_cache_dir
+        self.trace_memory = trace_memory
+        self.sampling = sampling
+        self.csv_backend = csv_backend
+        self.chunk_size = chunk_size
+
+    def with_options(self, **options):
+        # Copy of the analysis with some settings changed (backend, chunk
+        # size) for one dataset; the execution plan is shared.
+        analysis = copy.copy(self)
+        for name, value in options.items():
+            setattr(analysis, name, value)
+        return analysis
+
+    def check_set_version(self):
+        check_set = [CHECKS_VERSION] + [
+            [check.check, check.options()] for check in self.plan.checks
+        ]
+        if self.sampling:
+            check_set.append(["sampling", self.sampling.options()])
+        return hashlib.sha256(json.dumps(check_set).encode()).hexdigest()[:16]
+
+    def evict_parsed_cache(self):
+        if self.parsed_cache_dir:
+            evict_parsed_cache(self.parsed_cache_dir)
+
+    def run_check(self, accumulator_class, df):
+        return ExecutionPlan([accumulator_class]).run([df])[0]
+
+    def check_missing_values(self, df):
+        return self.run_check(MissingValuesAccumulator, df)
+
+    def check_null_values(self, df):
+        return self.run_check(NullValuesAccumulator, df)
+
+    def check_data_types(self, df):
+        return self.run_check(DataTypesAccumulator, df)
+
     def check_unique_identifier(self, df):
-        identifier_col = df.columns[0]
-        unique_values = df[identifier_col].nunique()
-        total_values = len(df[identifier_col])
-        return {
-            "check": "Unique Identifier Check",
-            "count": int(total_values - unique_values),
-            "total": int(total_values),
-            "percentage": (
-                float(((total_values - unique_values) / total_values) * 100)
-                if total_values
-                else 0.0
-            ),
-            # 'count': total_values - unique_values,
-            # 'total': total_values,
-            # 'percentage': ((total_values - unique_values) / total_values) * 100 if total_values else 0
-        }
+        return self.run_check(UniqueIdentifierAccumulator, df)
+
+    def create_accumulators(self):
+        return self.plan.create_accumulators()
+
+    def analyze_chunks(self, chunks, metrics=None):
+        return self.plan.run(chunks, metrics)
 
     def analyze(self, df):
-        return [
-            self.check_missing_values(df),
-            self.check_null_values(df),
-            self.check_data_types(df),
-            self.check_unique_identifier(df),
-        ]
+        return self.analyze_chunks([df])
 
     """ 
     def generate_report(self, individual_reports):
@@ -141,64 +1007,10 @@ class Analysis:
     """
 
     def generate_report(self, individual_reports):
-        combined_results = pd.DataFrame(
-            [res for report in individual_reports for res in report["analysis_results"]]
-        )
-
-        logging.info("--- Final Analysis Report ---")
-        number_of_dataset_analyzed = len(individual_reports)
-        print("\n--- Final Analysis Report ---")
-        print(f"Number of datasets analyzed: {number_of_dataset_analyzed}")
-        logging.info(f"Number of datasets analyzed: {number_of_dataset_analyzed}")
-        print("Combined results ")
-
-        # Calculate total records
-        total_records = combined_results["total"].sum()
-
-        # Calculate percentages for each category
-        summary = (
-            combined_results.groupby("check")
-            .agg({"count": "sum", "total": "sum"})
-            .reset_index()
-        )
-        summary["percentage"] = (summary["count"] / total_records) * 100
-
-        # Create the combined summary dictionary
-        combined_summary = {
-            "null_values": round(
-                summary[summary["check"] == "Null Values"]["percentage"].iloc[0], 2
-            ),
-            "invalid_data_types": round(
-                summary[summary["check"] == "Invalid Data Types"]["percentage"].iloc[0],
-                2,
-            ),
-            "missing_values": round(
-                summary[summary["check"] == "Missing Values"]["percentage"].iloc[0], 2
-            ),
-            "unique_identifier_check": round(
-                summary[summary["check"] == "Unique Identifier Check"][
-                    "percentage"
-                ].iloc[0],
-                2,
-            ),
-        }
-
-        # Print and log the combined summary
-        for check, percentage in combined_summary.items():
-            print(f"{check.replace('_', ' ').title()}: {percentage:.2f}%")
-            logging.info(f"{check.replace('_', ' ').title()}: {percentage:.2f}%")
-
-        # Print summary by check type
-        print("\nSummary by check type:")
-        for _, row in summary.iterrows():
-            print(
-                f"{row['check']}: {row['percentage']:.2f}% ({row['count']}/{row['total']})"
-            )
-            logging.info(
-                f"{row['check']}: {row['percentage']:.2f}% ({row['count']}/{row['total']})"
-            )
-
-        return combined_summary
+        combined_summary = CombinedSummary(self.sampling)
+        for report in individual_reports:
+            combined_summary.add(report)
+        return combined_summary.report()
 
     def generate_charts(self, combined_summary):
         sns.set(style="whitegrid")
@@ -227,92 +1039,1434 @@ class Analysis:
         plt.show()
 
 
-def load_dataset(file_name, chunk_size=10000):
-    file_ext = os.path.splitext(file_name)[1]
-    encodings_to_try = ["utf-8", "ISO-8859-1", "Windows-1252"]
+def sniff_encoding(sample):
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    # Bytes 0x80-0x9F are control characters in ISO-8859-1 but printable
+    # characters (quotes, dashes, euro sign) in Windows-1252.
+    if re.search(b"[\x80-\x9f]", sample):
+        return "Windows-1252"
+    return "ISO-8859-1"
 
-    if file_ext == ".csv":
-        for encoding in encodings_to_try:
-            try:
-                return pd.concat(
-                    pd.read_csv(file_name, encoding=encoding, chunksize=chunk_size)
-                )
-            except UnicodeDecodeError:
-                logging.warning(
-                    f"Failed to load {file_name} with {encoding} encoding. Trying next encoding..."
-                )
-        raise ValueError(f"Unable to decode file {file_name} with known encodings.")
 
-    elif file_ext == ".xlsx":
-        return pd.read_excel(file_name)
+def sniff_decimal(lines, sep):
+    if sep == ",":
+        return "."
+    comma_numbers = 0
+    dot_numbers = 0
+    for line in lines:
+        for field in line.split(sep):
+            field = field.strip().strip('"')
+            if re.fullmatch(r"-?\d+,\d+", field):
+                comma_numbers += 1
+            elif re.fullmatch(r"-?\d+\.\d+", field):
+                dot_numbers += 1
+    return "," if comma_numbers > dot_numbers else "."
 
-    elif file_ext == ".json":
-        return pd.read_json(file_name)
 
-    else:
-        raise ValueError(f"Unsupported file type: {file_ext}")
+@functools.lru_cache(maxsize=None)
+def sniff_csv_cached(file_name, file_size, modified):
+    with open(file_name, "rb") as f:
+        sample = f.read(SNIFF_BYTES)
 
+    encoding = sniff_encoding(sample)
+    text = codecs.getincrementaldecoder(encoding)(errors="replace").decode(sample)
+    lines = text.splitlines()
+    if len(sample) == SNIFF_BYTES and len(lines) > 1:
+        lines = lines[:-1]
+    text = "\n".join(lines)
 
-def process_dataset(dataset, analysis):
-    display_name = dataset.get("dataset_display_name")
-    file_name = dataset.get("dataset_file_name")
+    dialect = {"encoding": encoding, "sep": ",", "decimal": ".", "header": 0}
+    if not lines:
+        return dialect
 
-    logging.info(f"Loading dataset: {display_name}")
+    sniffer = csv.Sniffer()
     try:
-        df = load_dataset(file_name)
-        analysis_results = analysis.analyze(df)
-        # return json.dumps({"dataset_name": display_name, "dataset_file_path": file_name, "analysis_results": analysis_results})
-        return {
-            "dataset_name": display_name,
-            "dataset_file_path": file_name,
-            "analysis_results": analysis_results,
-        }
-    except Exception as e:
-        logging.error(f"Failed to load {file_name}: {e}")
-        return {
-            "dataset_name": display_name,
-            "dataset_file_path": file_name,
-            "analysis_results": [],
-            "error": str(e),
-        }
+        dialect["sep"] = sniffer.sniff(text, delimiters=DELIMITERS).delimiter
+    except csv.Error:
+        dialect["sep"] = max(DELIMITERS, key=lines[0].count)
+    dialect["decimal"] = sniff_decimal(lines[1:], dialect["sep"])
+    return dialect
 
 
-def process_datasets(json_file):
-    analysis = Analysis()
-    individual_reports = []
+def sniff_csv(file_name):
+    # Encoding, delimiter and decimal separator are decided once from a
+    # bounded byte prefix; the decision is cached until the file changes. The
+    # first line is always the header.
+    stat = os.stat(file_name)
+    return dict(sniff_csv_cached(file_name, stat.st_size, stat.st_mtime_ns))
 
-    with open(json_file, "r") as f:
-        datasets = json.load(f)
 
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        futures = [
-            executor.submit(process_dataset, dataset, analysis) for dataset in datasets
-        ]
-        for future in tqdm(
-            concurrent.futures.as_completed(futures), total=len(datasets)
+def estimate_line_count(file_name):
+    # Extrapolated from the line length in the sniffed prefix
+    file_size = os.path.getsize(file_name)
+    with open(file_name, "rb") as f:
+        sample = f.read(SNIFF_BYTES)
+    lines = sample.count(b"\n")
+    if len(sample) == file_size or not lines:
+        return lines + (not sample.endswith(b"\n"))
+    return int(file_size * lines / len(sample))
+
+
+# CSV parsers behind iter_dataset. Every backend yields DataFrame chunks with
+# the dtypes and missing values of pandas' C parser, so the check results do
+# not depend on the backend.
+CSV_BACKENDS = {}
+
+
+def csv_backend(name):
+    def register(func):
+        CSV_BACKENDS[name] = func
+        return func
+
+    return register
+
+
+@functools.lru_cache(maxsize=None)
+def arrow_available():
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def resolve_csv_backend(name, file_name=None):
+    # Arrow holds the whole file, so "auto" only uses it (when pyarrow is
+    # installed) for files up to ARROW_MAX_FILE_BYTES; larger files and files
+    # of unknown size go through the chunked pandas parser.
+    if name == "auto":
+        if (
+            file_name is not None
+            and arrow_available()
+            and os.path.getsize(file_name) <= ARROW_MAX_FILE_BYTES
         ):
-            individual_reports.append(future.result())
+            return "arrow"
+        return "pandas"
+    if name == "arrow" and not arrow_available():
+        raise ValueError("The arrow CSV backend needs pyarrow to be installed.")
+    return name
 
-    # Save individual dataset analysis report
-    print("=" * 80)
-    print("Individual Report")
-    print("=" * 80)
-    print("*" * 80)
-    pprint(individual_reports)
-    print("*" * 80)
-    individual_dataset_analysis_report_file_name = (
-        "individual_dataset_analysis_report.json"
-    )
-    if DEBUG:
-        individual_dataset_analysis_report_file_name = (
-            "individual_dataset_analysis_report_debug.json"
-        )
 
-    with open(individual_dataset_analysis_report_file_name, "w") as f:
-        json.dump(individual_reports, f, indent=4)
+@csv_backend("pandas")
+def read_csv_pandas(file_name, chunk_size, dialect, columns=None, skiprows=None):
+    with pd.read_csv(
+        file_name,
+        chunksize=chunk_size,
+        usecols=columns,
+        skiprows=skiprows,
+        **dialect,
+    ) as reader:
+        yield from reader
+
+
+def arrow_type_matches_pandas(arrow_type):
+    import pyarrow as pa
+
+    return (
+        pa.types.is_int64(arrow_type)
+        or pa.types.is_float64(arrow_type)
+        or pa.types.is_boolean(arrow_type)
+        or pa.types.is_string(arrow_type)
+        or pa.types.is_null(arrow_type)
+    )
+
+
+def read_csv_arrow_table(file_name, dialect, column_types=None):
+    import pyarrow.csv as arrow_csv
+
+    return arrow_csv.read_csv(
+        file_name,
+        read_options=arrow_csv.ReadOptions(
+            encoding=dialect["encoding"], use_threads=True
+        ),
+        parse_options=arrow_csv.ParseOptions(
+            delimiter=dialect.get("sep", ","), newlines_in_values=True
+        ),
+        convert_options=arrow_csv.ConvertOptions(
+            column_types=column_types,
+            null_values=PANDAS_NA_VALUES,
+            strings_can_be_null=True,
+            true_values=PANDAS_TRUE_VALUES,
+            false_values=PANDAS_FALSE_VALUES,
+            decimal_point=dialect.get("decimal", "."),
+        ),
+    )
+
+
+@csv_backend("arrow")
+def read_csv_arrow(file_name, chunk_size, dialect, columns=None, skiprows=None):
+    # The file is parsed into an Arrow table on all cores (strings stay in
+    # Arrow buffers, about the size of the file) and handed out as pandas
+    # chunks. Arrow also infers dates and times, which pandas leaves as text,
+    # so those columns are parsed again as strings. Row thinning and whatever
+    # Arrow cannot parse go through the pandas parser.
+    import pyarrow as pa
+
+    if skiprows is not None:
+        yield from read_csv_pandas(file_name, chunk_size, dialect, columns, skiprows)
+        return
+
+    try:
+        table = read_csv_arrow_table(file_name, dialect)
+        text_columns = {
+            field.name: pa.string()
+            for field in table.schema
+            if not arrow_type_matches_pandas(field.type)
+        }
+        if text_columns:
+            table = read_csv_arrow_table(file_name, dialect, text_columns)
+    except pa.ArrowInvalid as e:
+        logging.info(f"Arrow could not parse {file_name} ({e}), using pandas")
+        yield from read_csv_pandas(file_name, chunk_size, dialect, columns)
+        return
+
+    if columns is not None:
+        table = table.select(columns)
+    for position, field in enumerate(table.schema):
+        # An empty column is float64 in pandas
+        if pa.types.is_null(field.type):
+            table = table.set_column(
+                position, field.name, table.column(position).cast(pa.float64())
+            )
+    # Column labels as pandas makes them (numbered without a header, with
+    # ".1" suffixes for repeated names)
+    column_names = pd.read_csv(file_name, nrows=0, usecols=columns, **dialect).columns
+    for batch in table.to_batches(max_chunksize=chunk_size):
+        chunk = batch.to_pandas()
+        chunk.columns = column_names
+        yield chunk
+
+
+def xlsx_cell_value(cell):
+    # Cell values converted the way the pandas openpyxl reader does
+    from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+
+    if cell.value is None:
+        return ""
+    if cell.data_type == TYPE_ERROR:
+        return np.nan
+    if cell.data_type == TYPE_NUMERIC:
+        value = int(cell.value)
+        return value if value == cell.value else float(cell.value)
+    return cell.value
+
+
+def xlsx_blank(cells):
+    return all(cell.value in (None, "") for cell in cells)
+
+
+def xlsx_row(cells, columns=None):
+    # Only the cells at the given positions are converted, like usecols
+    if columns is not None:
+        return [
+            xlsx_cell_value(cells[position]) if position < len(cells) else ""
+            for position in columns
+        ]
+    row = [xlsx_cell_value(cell) for cell in cells]
+    while row and row[-1] == "":
+        row.pop()
+    return row
+
+
+def xlsx_frame(header, rows):
+    # Rows are padded to the widest row so far (the header grows unnamed
+    # columns) and parsed with the text parser pd.read_excel uses, so values
+    # and dtypes are inferred as in a full read of the chunk.
+    from pandas.io.parsers import TextParser
+
+    width = max([len(header)] + [len(row) for row in rows])
+    header.extend([""] * (width - len(header)))
+    rows = [row + [""] * (width - len(row)) for row in rows]
+    return TextParser([header] + rows, header=0, skip_blank_lines=False).read()
+
+
+def xlsx_width(sheet):
+    # Widest row of the sheet without its trailing empty cells. Rows can be
+    # wider than the header, and a full read pads every row to the widest
+    # one, so the width is taken in a pass over the values before the chunks
+    # are read.
+    width = 0
+    for values in sheet.iter_rows(values_only=True):
+        for position in range(len(values), width, -1):
+            if values[position - 1] not in (None, ""):
+                width = position
+                break
+    return width
+
+
+def iter_xlsx(file_name, chunk_size, columns=None):
+    # The first sheet is read row by row from the workbook XML (read-only
+    # mode) instead of being loaded whole. Blank rows inside the sheet are
+    # kept, trailing blank rows are dropped like pd.read_excel does. The
+    # header is padded to the sheet's width so every chunk has all columns,
+    # or has only the given column positions; the width pass is skipped when
+    # the header already covers them.
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(file_name, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        sheet.reset_dimensions()
+        rows = iter(sheet.rows)
+        header = xlsx_row(next(rows, ()))
+        if columns is None or max(columns, default=0) >= len(header):
+            width = xlsx_width(sheet)
+            header.extend([""] * (width - len(header)))
+        if columns is not None:
+            header = [header[position] for position in columns]
+        chunk, blank_rows = [], []
+        empty = True
+        for cells in rows:
+            if xlsx_blank(cells):
+                blank_rows.append([])
+                continue
+            chunk.extend(blank_rows)
+            blank_rows = []
+            chunk.append(xlsx_row(cells, columns))
+            if len(chunk) >= chunk_size:
+                yield xlsx_frame(header, chunk)
+                chunk = []
+                empty = False
+        if chunk or (empty and header):
+            yield xlsx_frame(header, chunk)
+        elif empty:
+            yield pd.DataFrame()
+    finally:
+        workbook.close()
+
+
+def json_layout(file_name):
+    # "array" for a top-level array of records, "lines" for one JSON value
+    # per line and "document" for anything else (e.g. an object of columns),
+    # judged from the start of the file.
+    with open(file_name, "r", encoding="utf-8") as f:
+        head = f.read(SNIFF_BYTES).lstrip()
+    if head.startswith("["):
+        return "array"
+    first_line, newline, rest = head.partition("\n")
+    if not newline or not rest.strip():
+        return "document"
+    try:
+        json.loads(first_line)
+    except ValueError:
+        return "document"
+    return "lines"
+
+
+JSON_WHITESPACE = re.compile(r"[\s,]*")
+JSON_ELEMENT_END = re.compile(r"\s*[,\]]")
+
+
+def iter_json_array(file_name, block_size=JSON_BLOCK_SIZE):
+    # Yields the source text and the decoded value of every element of a
+    # top-level JSON array, reading the file block by block. An element is
+    # only taken once a "," or the closing "]" follows it; one that runs to
+    # the end of the buffer (a number cut after its "." or "e" decodes
+    # short) is decoded again once the next block was read.
+    decoder = json.JSONDecoder()
+    with open(file_name, "r", encoding="utf-8") as f:
+        buffer = ""
+        while not buffer:
+            block = f.read(block_size)
+            if not block:
+                return
+            buffer = block.lstrip()
+        buffer = buffer[1:]
+        position = 0
+        eof = False
+        while True:
+            position = JSON_WHITESPACE.match(buffer, position).end()
+            if position == len(buffer) and not eof:
+                buffer = f.read(block_size)
+                position = 0
+                eof = not buffer
+                continue
+            if buffer.startswith("]", position):
+                return
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+                complete = JSON_ELEMENT_END.match(buffer, end)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = None
+            if not complete and not eof:
+                block = f.read(block_size)
+                eof = not block
+                buffer = buffer[position:] + block
+                position = 0
+                continue
+            yield buffer[position:end], value
+            position = end
+
+
+def iter_json_records(file_name, layout):
+    if layout == "lines":
+        with open(file_name, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        for _, record in iter_json_array(file_name):
+            yield record
+
+
+def json_array_chunks(file_name, chunk_size):
+    elements = iter_json_array(file_name)
+    empty = True
+    while True:
+        batch = [text for text, _ in itertools.islice(elements, chunk_size)]
+        if batch or empty:
+            text = "[" + ",".join(batch) + "]"
+            yield pd.read_json(io.StringIO(text), convert_axes=False)
+            empty = False
+        if len(batch) < chunk_size:
+            return
+
+
+def json_columns(file_name, layout):
+    # Union of the record keys in first-seen order, the columns of a full
+    # read. Records can leave out keys, so a column may first show up late
+    # in the file; the keys are collected in a pass over the records before
+    # the chunks are read. Lists and scalars are columns by position.
+    columns = {}
+    for record in iter_json_records(file_name, layout):
+        if isinstance(record, dict):
+            if not columns.keys() >= record.keys():
+                columns.update(dict.fromkeys(record))
+        else:
+            width = len(record) if isinstance(record, list) else 1
+            columns.update(dict.fromkeys(range(width)))
+    return pd.Index(list(columns))
+
+
+def iter_json(file_name, chunk_size):
+    # JSON lines are read with the pandas chunked reader and arrays are split
+    # into elements, each chunk of elements parsed by pd.read_json so values
+    # and dtypes are inferred as in a full read. Every chunk is reindexed to
+    # the file's columns; the keys are not converted (convert_axes) so they
+    # match the keys of the records. Other layouts cannot be split into rows
+    # and are read whole.
+    layout = json_layout(file_name)
+    if layout == "document":
+        yield pd.read_json(file_name)
+        return
+    columns = json_columns(file_name, layout)
+    if layout == "lines":
+        chunks = pd.read_json(
+            file_name, lines=True, chunksize=chunk_size, convert_axes=False
+        )
+    else:
+        chunks = json_array_chunks(file_name, chunk_size)
+    with contextlib.closing(chunks):
+        for chunk in chunks:
+            if not chunk.columns.equals(columns):
+                chunk = chunk.reindex(columns=columns)
+            yield chunk
+
+
+def iter_dataset(
+    file_name,
+    chunk_size=CHUNK_SIZE,
+    dialect=None,
+    columns=None,
+    skiprows=None,
+    backend=CSV_BACKEND,
+):
+    file_ext = os.path.splitext(file_name)[1]
+
+    if file_ext == ".csv":
+        dialect = dialect or {"encoding": "utf-8"}
+        yield from CSV_BACKENDS[resolve_csv_backend(backend, file_name)](
+            file_name, chunk_size, dialect, columns, skiprows
+        )
+
+    elif file_ext == ".xlsx":
+        yield from iter_xlsx(file_name, chunk_size, columns)
+
+    elif file_ext == ".json":
+        chunks = iter_json(file_name, chunk_size)
+        yield from chunks if columns is None else project(chunks, columns)
+
+    else:
+        raise ValueError(f"Unsupported file type: {file_ext}")
+
+
+def source_stamp(file_name):
+    # Pickled frames are only read back by the pandas and numpy versions that
+    # wrote them.
+    stat = os.stat(file_name)
+    return {
+        "path": os.path.abspath(file_name),
+        "size": stat.st_size,
+        "modified": stat.st_mtime_ns,
+        "version": PARSED_CACHE_VERSION,
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+    }
+
+
+# Errors of unpickling a parsed copy, e.g. one written by other pandas
+# internals; the copy is treated as missing.
+PICKLE_ERRORS = (
+    EOFError,
+    pickle.UnpicklingError,
+    AttributeError,
+    ImportError,
+    TypeError,
+    ValueError,
+)
+
+
+class ParsedCacheError(Exception):
+    pass
+
+
+def read_stamp(path):
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except (OSError,) + PICKLE_ERRORS:
+        return None
+
+
+# Binary copy of a parsed file: a header with the source file's stamp
+# followed by the pickled DataFrame chunks. Pickling keeps the numpy column
+# blocks and dtypes exactly as parsed, and reading it back chunk by chunk
+# keeps memory bounded like the CSV path.
+class ParsedCache:
+    def __init__(self, file_name, cache_dir=PARSED_CACHE_DIR):
+        self.file_name = file_name
+        self.cache_dir = cache_dir
+        key = hashlib.sha256(os.path.abspath(file_name).encode()).hexdigest()
+        self.path = os.path.join(cache_dir, f"{key}.pkl")
+
+    def is_fresh(self):
+        return read_stamp(self.path) == source_stamp(self.file_name)
+
+    def read(self):
+        # A copy that cannot be unpickled raises ParsedCacheError, so the
+        # caller can parse the source file instead.
+        with open(self.path, "rb") as f:
+            os.utime(self.path)
+            pickle.load(f)
+            while True:
+                try:
+                    chunk = pickle.load(f)
+                except EOFError:
+                    return
+                except PICKLE_ERRORS as e:
+                    raise ParsedCacheError(f"Unreadable parsed copy {self.path}") from e
+                yield chunk
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def write_through(self, chunks):
+        # Chunks are passed on unchanged; the copy is only moved into place
+        # once every chunk of the source file was read without error.
+        os.makedirs(self.cache_dir, exist_ok=True)
+        stamp = source_stamp(self.file_name)
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        complete = False
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(stamp, f, protocol=pickle.HIGHEST_PROTOCOL)
+                for chunk in chunks:
+                    pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+                    yield chunk
+            os.replace(temp_path, self.path)
+            complete = True
+        finally:
+            if not complete:
+                os.remove(temp_path)
+
+
+def clear_parsed_cache(cache_dir=PARSED_CACHE_DIR):
+    if not os.path.isdir(cache_dir):
+        return
+    for entry in os.scandir(cache_dir):
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def evict_parsed_cache(cache_dir=PARSED_CACHE_DIR, max_bytes=PARSED_CACHE_MAX_BYTES):
+    # Copies whose source file is gone or changed are removed first, then the
+    # least recently read ones until the cache fits max_bytes.
+    if not os.path.isdir(cache_dir):
+        return
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if not entry.name.endswith(".pkl"):
+            continue
+        stamp = read_stamp(entry.path)
+        try:
+            fresh = stamp is not None and stamp == source_stamp(stamp["path"])
+        except (OSError, KeyError, TypeError):
+            fresh = False
+        try:
+            if not fresh:
+                os.remove(entry.path)
+                continue
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, entry_path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(entry_path)
+        except FileNotFoundError:
+            pass
+        total_bytes -= size
+
+
+def project(chunks, columns):
+    for chunk in chunks:
+        yield chunk.iloc[:, columns]
+
+
+def read_with_encodings(
+    file_name,
+    consume,
+    chunk_size=CHUNK_SIZE,
+    parsed_cache_dir=None,
+    columns=None,
+    metrics=None,
+    skiprows=None,
+    backend=CSV_BACKEND,
+):
+    metrics = metrics or DatasetMetrics()
+
+    # Only full parses are written to the parsed cache; a projected or thinned
+    # read can still be served from a full copy.
+    parse = consume
+    if parsed_cache_dir:
+        parsed_cache = ParsedCache(file_name, parsed_cache_dir)
+        if parsed_cache.is_fresh():
+            metrics.encoding = "parsed_cache"
+            chunks = parsed_cache.read()
+            try:
+                return consume(chunks if columns is None else project(chunks, columns))
+            except ParsedCacheError as e:
+                logging.warning(f"{e}; parsing {file_name} again")
+                parsed_cache.remove()
+        if columns is None and skiprows is None:
+            parse = lambda chunks: consume(parsed_cache.write_through(chunks))
+
+    if os.path.splitext(file_name)[1] != ".csv":
+        return parse(iter_dataset(file_name, chunk_size, columns=columns))
+
+    # The sniffed encoding only covers the prefix; if a later chunk still
+    # fails to decode, the pass is retried with the remaining encodings.
+    with metrics.phase("sniff"):
+        dialect = sniff_csv(file_name)
+    encodings = [dialect["encoding"]] + [
+        encoding for encoding in ENCODINGS_TO_TRY if encoding != dialect["encoding"]
+    ]
+    for encoding in encodings:
+        dialect["encoding"] = encoding
+        metrics.encoding = encoding
+        metrics.encoding_attempts += 1
+        try:
+            return parse(
+                iter_dataset(file_name, chunk_size, dialect, columns, skiprows, backend)
+            )
+        except UnicodeDecodeError:
+            logging.warning(
+                f"Failed to load {file_name} with {encoding} encoding. Trying next encoding..."
+            )
+    raise ValueError(f"Unable to decode file {file_name} with known encodings.")
+
+
+def load_dataset(
+    file_name,
+    chunk_size=CHUNK_SIZE,
+    parsed_cache_dir=PARSED_CACHE_DIR,
+    columns=None,
+    backend=CSV_BACKEND,
+):
+    return read_with_encodings(
+        file_name, pd.concat, chunk_size, parsed_cache_dir, columns, backend=backend
+    )
+
+
+def analyze_dataset(file_name, analysis, metrics=None):
+    if analysis.sampling:
+        return analyze_dataset_sampled(file_name, analysis, metrics)
+
+    # Only the columns the selected checks read are loaded.
+    return read_with_encodings(
+        file_name,
+        lambda chunks: analysis.analyze_chunks(chunks, metrics),
+        analysis.chunk_size,
+        parsed_cache_dir=analysis.parsed_cache_dir,
+        columns=analysis.plan.columns,
+        metrics=metrics,
+        backend=analysis.csv_backend,
+    )
+
+
+def analyze_dataset_sampled(file_name, analysis, metrics=None):
+    metrics = metrics or DatasetMetrics()
+    sampling = analysis.sampling
+    results = {}
+
+    # Checks that cannot be estimated from a sample read all rows of the
+    # columns they need in a pass of their own.
+    full_plan = ExecutionPlan(
+        [check for check in analysis.plan.checks if not check.sampleable]
+    )
+    if full_plan.checks:
+        for result in read_with_encodings(
+            file_name,
+            lambda chunks: full_plan.run(chunks, metrics),
+            analysis.chunk_size,
+            parsed_cache_dir=analysis.parsed_cache_dir,
+            columns=full_plan.columns,
+            metrics=metrics,
+            backend=analysis.csv_backend,
+        ):
+            results[result["check"]] = result
+
+    sample_plan = ExecutionPlan(
+        [check for check in analysis.plan.checks if check.sampleable]
+    )
+    if sample_plan.checks:
+        seed = sampling.file_seed(file_name)
+        thinner = None
+        if os.path.splitext(file_name)[1] == ".csv":
+            with metrics.phase("sniff"):
+                lines = estimate_line_count(file_name)
+            if lines > SAMPLE_OVERSAMPLING * sampling.rows:
+                thinner = RowThinner(SAMPLE_OVERSAMPLING * sampling.rows / lines, seed)
+
+        def draw(chunks):
+            reservoir = Reservoir(sampling.rows, seed)
+            with metrics.phase("sample"):
+                for chunk in chunks:
+                    reservoir.add(chunk)
+            return reservoir
+
+        reservoir = read_with_encodings(
+            file_name,
+            draw,
+            analysis.chunk_size,
+            parsed_cache_dir=analysis.parsed_cache_dir,
+            columns=sample_plan.columns,
+            metrics=metrics,
+            skiprows=thinner,
+            backend=analysis.csv_backend,
+        )
+        population_rows = reservoir.rows_seen
+        if thinner and thinner.lines:
+            # The lines the thinner saw, less the header line
+            population_rows = thinner.lines - 1
+        population_rows = max(population_rows, len(reservoir.keys))
+        sample = [] if reservoir.sample is None else [reservoir.sample]
+        for result in sample_plan.run(sample, metrics):
+            results[result["check"]] = sampled_result(
+                result, len(reservoir.keys), population_rows, sampling
+            )
+
+    return [results[check.check] for check in analysis.plan.checks]
+
+
+def file_sha256(file_name):
+    digest = hashlib.sha256()
+    with open(file_name, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Analysis results stored on disk by file content hash and check set version,
+# one json file per entry. The least recently used entries are evicted once
+# the cache grows past max_bytes.
+class ResultCache:
+    def __init__(self, path=RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+
+    def entry_path(self, key):
+        return os.path.join(self.path, f"{key}.json")
+
+    def get(self, key):
+        entry_path = self.entry_path(key)
+        try:
+            with open(entry_path, "r") as f:
+                results = json.load(f)
+            os.utime(entry_path)
+            return results
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, results):
+        os.makedirs(self.path, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(results, f)
+        os.replace(temp_path, self.entry_path(key))
+
+    def entries(self):
+        if not os.path.isdir(self.path):
+            return []
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(".json"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return sorted(entries)
+
+    def evict(self):
+        entries = self.entries()
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, entry_path in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(entry_path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+
+    def clear(self):
+        for _, _, entry_path in self.entries():
+            try:
+                os.remove(entry_path)
+            except FileNotFoundError:
+                pass
+
+
+def dataset_sha256(dataset):
+    # get_data.py records the hash computed while downloading; it is reused as
+    # long as the file on disk still has the recorded size.
+    file_name = dataset.get("dataset_file_name")
+    recorded = dataset.get("sha256")
+    if recorded and dataset.get("size") == os.path.getsize(file_name):
+        return recorded
+    return file_sha256(file_name)
+
+
+def analyze_dataset_cached(dataset, analysis, cache, metrics=None):
+    metrics = metrics or DatasetMetrics()
+    file_name = dataset.get("dataset_file_name")
+    if cache is None:
+        return analyze_dataset(file_name, analysis, metrics)
+
+    with metrics.phase("hash"):
+        key = f"{dataset_sha256(dataset)}-{analysis.check_set_version()}"
+    analysis_results = cache.get(key)
+    if analysis_results is None:
+        analysis_results = analyze_dataset(file_name, analysis, metrics)
+        cache.put(key, analysis_results)
+    else:
+        metrics.cached = True
+        logging.info(f"Using cached results for {file_name}")
+    return analysis_results
+
+
+def format_phases(metrics):
+    return ", ".join(
+        f"{phase} {seconds:.3f}s"
+        for phase, seconds in sorted(
+            metrics["phases"].items(), key=lambda item: item[1], reverse=True
+        )
+    )
+
+
+def process_dataset(dataset, analysis, cache=None):
+    display_name = dataset.get("dataset_display_name")
+    file_name = dataset.get("dataset_file_name")
+
+    logging.info(f"Loading dataset: {display_name}")
+    metrics = DatasetMetrics(analysis.trace_memory)
+    try:
+        analysis_results = analyze_dataset_cached(dataset, analysis, cache, metrics)
+        # return json.dumps({"dataset_name": display_name, "dataset_file_path": file_name, "analysis_results": analysis_results})
+        report = {
+            "dataset_name": display_name,
+            "dataset_file_path": file_name,
+            "analysis_results": analysis_results,
+        }
+    except Exception as e:
+        logging.error(f"Failed to load {file_name}: {e}")
+        report = {
+            "dataset_name": display_name,
+            "dataset_file_path": file_name,
+            "analysis_results": [],
+            "error": str(e),
+        }
+    report["metrics"] = metrics.as_dict()
+    logging.info(
+        f"Analyzed {display_name} in {report['metrics']['wall_seconds']:.3f}s "
+        f"({format_phases(report['metrics'])})"
+    )
+    return report
+
+
+def parse_size(text):
+    # "512M", "4G", "1.5GiB" or a plain number of bytes
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)(?:i?B)?\s*", text, re.I)
+    if not match:
+        raise ValueError(f"Invalid size: {text}")
+    exponent = " KMGT".index(match.group(2).upper() or " ")
+    return int(float(match.group(1)) * 1024**exponent)
+
+
+def csv_bytes_per_row(file_name, analysis):
+    # Parse the first rows with pandas and measure them
+    dialect = sniff_csv(file_name)
+    df = pd.read_csv(
+        file_name, nrows=ESTIMATE_ROWS, usecols=analysis.plan.columns, **dialect
+    )
+    return df.memory_usage(deep=True).sum() / max(len(df), 1)
+
+
+def estimate_memory(file_name, analysis):
+    # Bytes one dataset needs while it is analyzed: the chunked path holds a
+    # chunk and the check state, the Arrow loader holds the file as well.
+    # Returns (chunked bytes, whole file bytes), either None if the file has
+    # no such path. The json and xlsx readers stream chunks too, but their
+    # row count is unknown without reading the file, so the size of the
+    # whole parsed file is their only estimate.
+    file_size = os.path.getsize(file_name)
+    file_ext = os.path.splitext(file_name)[1]
+    if file_ext != ".csv":
+        return None, int(file_size * WHOLE_FILE_MEMORY_FACTORS.get(file_ext, 1))
+
+    rows = estimate_line_count(file_name)
+    try:
+        bytes_per_row = csv_bytes_per_row(file_name, analysis)
+    except (ValueError, UnicodeDecodeError):
+        bytes_per_row = file_size / max(rows, 1) * CHUNK_MEMORY_FACTOR
+    chunk_rows = min(analysis.chunk_size, rows)
+    if analysis.sampling:
+        chunk_rows += min(analysis.sampling.rows, rows)
+    chunked = int(
+        bytes_per_row * chunk_rows * CHUNK_MEMORY_FACTOR
+        + sum(check.state_bytes(rows) for check in analysis.plan.checks)
+    )
+    whole = None
+    if resolve_csv_backend(analysis.csv_backend, file_name) == "arrow":
+        whole = chunked + int(file_size * WHOLE_FILE_MEMORY_FACTORS[".csv"])
+    return chunked, whole
+
+
+def admit_dataset(dataset, analysis, memory_budget):
+    # How a dataset is run within the budget: the whole file path if it fits,
+    # else the chunked pandas path, with smaller chunks if even one chunk is
+    # too large. A file with only a whole file estimate keeps it, so one over
+    # the budget runs alone. Returns (estimated bytes, analysis for the
+    # dataset).
+    try:
+        chunked, whole = estimate_memory(dataset.get("dataset_file_name"), analysis)
+    except (OSError, TypeError, ValueError):
+        return 0, analysis
+    if chunked is None:
+        return whole, analysis
+    if whole is not None and whole <= memory_budget:
+        return whole, analysis
+    if chunked > memory_budget:
+        chunk_size = max(
+            int(analysis.chunk_size * memory_budget / chunked), MIN_CHUNK_SIZE
+        )
+        chunked = int(chunked * chunk_size / analysis.chunk_size)
+        return chunked, analysis.with_options(
+            csv_backend="pandas", chunk_size=chunk_size
+        )
+    return chunked, analysis.with_options(csv_backend="pandas")
+
+
+EXECUTORS = {
+    "thread": concurrent.futures.ThreadPoolExecutor,
+    "process": concurrent.futures.ProcessPoolExecutor,
+}
+
+
+def dataset_file_size(dataset):
+    try:
+        return os.path.getsize(dataset.get("dataset_file_name"))
+    except (OSError, TypeError):
+        return 0
+
+
+def recorded_content(dataset):
+    # Hash and size get_data.py recorded for the dataset's file. Shards are
+    # cut from these alone, not from the local files, so every node that
+    # shares the data info file computes the same partition.
+    if not dataset.get("sha256") or dataset.get("size") is None:
+        raise ValueError(
+            f"{dataset.get('dataset_file_name')} has no recorded sha256 and size; "
+            "download the datasets with get_data.py to shard them"
+        )
+    return dataset["sha256"], dataset["size"]
+
+
+def parse_shard(text):
+    # "2/4" is the second of four shards
+    match = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)\s*", text)
+    if not match or not 1 <= int(match.group(1)) <= int(match.group(2)):
+        raise ValueError(f"Invalid shard: {text}")
+    return int(match.group(1)), int(match.group(2))
+
+
+def shard_datasets(datasets, shard, shards):
+    # Indexes of the datasets of one shard. Datasets with the same content
+    # stay together so they are analyzed once, as in a single run. The groups
+    # go largest first to the shard with the fewest bytes so far; ties are
+    # broken by position.
+    groups = {}
+    sizes = {}
+    for index, dataset in enumerate(datasets):
+        sha256, size = recorded_content(dataset)
+        groups.setdefault(sha256, []).append(index)
+        sizes[sha256] = size
+    loads = [(0, position) for position in range(shards)]
+    selected = []
+    for sha256, indexes in sorted(
+        groups.items(), key=lambda item: (-sizes[item[0]], item[1][0])
+    ):
+        load, position = heapq.heappop(loads)
+        if position == shard - 1:
+            selected.extend(indexes)
+        heapq.heappush(loads, (load + sizes[sha256], position))
+    return sorted(selected)
+
+
+def content_key(dataset):
+    # get_data.py stores identical downloads once and records their hash, so
+    # catalog entries with the same content share a key. Without a usable
+    # recorded hash the file itself is the key.
+    file_name = dataset.get("dataset_file_name")
+    if dataset.get("sha256") and dataset.get("size") == dataset_file_size(dataset):
+        return dataset["sha256"]
+    return os.path.realpath(file_name) if file_name else id(dataset)
+
+
+def shared_report(report, dataset):
+    # Report of a dataset whose content was analyzed for another dataset
+    return dict(
+        report,
+        dataset_name=dataset.get("dataset_display_name"),
+        dataset_file_path=dataset.get("dataset_file_name"),
+        duplicate_of=report.get("duplicate_of", report["dataset_name"]),
+    )
+
+
+def iter_datasets(
+    datasets,
+    analysis,
+    executor_name="thread",
+    workers=None,
+    cache=None,
+    memory_budget=None,
+    executor=None,
+):
+    # Every distinct file content is analyzed once and its report is given to
+    # all the datasets that share it.
+    groups = {}
+    for index, dataset in enumerate(datasets):
+        groups.setdefault(content_key(dataset), []).append(index)
+    groups = list(groups.values())
+    distinct = [datasets[indexes[0]] for indexes in groups]
+    for position, report in iter_distinct_datasets(
+        distinct, analysis, executor_name, workers, cache, memory_budget, executor
+    ):
+        first, *others = groups[position]
+        yield first, report
+        for index in others:
+            yield index, shared_report(report, datasets[index])
+
+
+def iter_distinct_datasets(
+    datasets,
+    analysis,
+    executor_name="thread",
+    workers=None,
+    cache=None,
+    memory_budget=None,
+    executor=None,
+):
+    # Largest files are submitted first so they do not end up as stragglers.
+    # Reports are yielded as they complete, together with their input index.
+    # A pool is created for the call unless a running one is passed in.
+    order = sorted(
+        range(len(datasets)),
+        key=lambda index: dataset_file_size(datasets[index]),
+        reverse=True,
+    )
+
+    with contextlib.ExitStack() as stack:
+        if executor is None:
+            executor = stack.enter_context(
+                EXECUTORS[executor_name](max_workers=workers)
+            )
+        if memory_budget is None:
+            futures = {
+                executor.submit(
+                    process_dataset, datasets[index], analysis, cache
+                ): index
+                for index in order
+            }
+            for future in tqdm(
+                concurrent.futures.as_completed(futures), total=len(datasets)
+            ):
+                yield futures.pop(future), future.result()
+            return
+
+        yield from iter_datasets_within_budget(
+            executor, datasets, order, analysis, cache, memory_budget
+        )
+
+
+def iter_datasets_within_budget(
+    executor, datasets, order, analysis, cache, memory_budget
+):
+    # A dataset is submitted only while the estimated memory of the running
+    # ones plus its own fits the budget. The pending datasets are tried
+    # largest first and smaller ones fill the room a large one leaves; one
+    # dataset is always admitted when nothing runs, even if it is over budget.
+    pending = [
+        (index, *admit_dataset(datasets[index], analysis, memory_budget))
+        for index in order
+    ]
+    futures = {}
+    in_use = 0
+    with tqdm(total=len(datasets)) as progress:
+        while pending or futures:
+            waiting = []
+            for index, estimate, dataset_analysis in pending:
+                if futures and in_use + estimate > memory_budget:
+                    waiting.append((index, estimate, dataset_analysis))
+                    continue
+                future = executor.submit(
+                    process_dataset, datasets[index], dataset_analysis, cache
+                )
+                futures[future] = (index, estimate)
+                in_use += estimate
+            pending = waiting
+
+            done, _ = concurrent.futures.wait(
+                futures, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                index, estimate = futures.pop(future)
+                in_use -= estimate
+                progress.update()
+                report = future.result()
+                report["metrics"]["memory_estimate_bytes"] = estimate
+                yield index, report
+
+
+# Appends every report to a JSON lines file as soon as it is done and keeps
+# only its byte offset, so the ordered json report can be written at the end
+# without holding the reports in memory.
+def apply_umask(path):
+    # mkstemp creates files readable by the owner only; files moved into
+    # place get the mode open() would have given them.
+    os.chmod(path, 0o666 & ~UMASK)
+
+
+class ReportWriter:
+    def __init__(self, jsonl_path):
+        self.jsonl_path = jsonl_path
+        self.file = open(jsonl_path, "wb")
+        self.offsets = {}
+
+    def write(self, index, report):
+        self.offsets[index] = self.file.tell()
+        self.file.write(json.dumps(report).encode() + b"\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def iter_reports(self):
+        with open(self.jsonl_path, "rb") as f:
+            for index in sorted(self.offsets):
+                f.seek(self.offsets[index])
+                yield json.loads(f.readline())
+
+    def write_json(self, json_path):
+        # Same layout as json.dump(reports, f, indent=4)
+        with open(json_path, "w") as f:
+            f.write("[")
+            for position, report in enumerate(self.iter_reports()):
+                f.write(",\n" if position else "\n")
+                f.write(
+                    "\n".join(
+                        "    " + line
+                        for line in json.dumps(report, indent=4).split("\n")
+                    )
+                )
+            f.write("\n]" if self.offsets else "]")
+
+
+# Report lines of one shard: a header describing the run, one line per
+# dataset report with its index in the data info file and, once the shard is
+# complete, the raw count/total sums of its combined summary. The file is
+# only moved into place when the shard finished.
+class PartialReportWriter:
+    def __init__(self, path, header):
+        self.path = path
+        fd, self.temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path) or ".", suffix=".tmp"
+        )
+        self.file = os.fdopen(fd, "w", encoding="utf-8")
+        self.file.write(json.dumps({"partial_report": header}) + "\n")
+
+    def write(self, index, report):
+        self.file.write(json.dumps({"index": index, "report": report}) + "\n")
+        self.file.flush()
+
+    def close(self, combined_summary):
+        self.file.write(json.dumps({"summary": combined_summary.state()}) + "\n")
+        self.file.close()
+        apply_umask(self.temp_path)
+        os.replace(self.temp_path, self.path)
+
+
+def read_partial_report(path):
+    # Returns (header, summary state, iterator of (index, report)); the
+    # reports are read lazily, the rest is checked up front.
+    with open(path, "r", encoding="utf-8") as f:
+        header = json.loads(f.readline()).get("partial_report")
+        last_line = None
+        for last_line in f:
+            pass
+    summary = json.loads(last_line).get("summary") if last_line else None
+    if header is None or summary is None:
+        raise ValueError(f"{path} is not a complete partial report")
+
+    def iter_reports():
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                if "report" in entry:
+                    yield entry["index"], entry["report"]
+
+    return header, summary, iter_reports()
+
+
+# Chrome trace event file (chrome://tracing, ui.perfetto.dev) with one span
+# per dataset and per report write. The phases of a dataset are interleaved
+# chunk by chunk, so they are drawn one after another inside the dataset span
+# with their total duration.
+class TraceWriter:
+    def __init__(self, path):
+        self.file = open(path, "w")
+        self.file.write("[")
+        self.event_count = 0
+
+    def event(self, name, category, started, seconds, pid, thread, args=None):
+        self.file.write(",\n" if self.event_count else "\n")
+        self.file.write(
+            json.dumps(
+                {
+                    "name": name,
+                    "cat": category,
+                    "ph": "X",
+                    "ts": started * 1e6,
+                    "dur": seconds * 1e6,
+                    "pid": pid,
+                    "tid": thread,
+                    "args": args or {},
+                }
+            )
+        )
+        self.event_count += 1
+
+    def dataset(self, report):
+        metrics = report["metrics"]
+        args = {key: value for key, value in metrics.items() if key != "phases"}
+        args["file"] = report["dataset_file_path"]
+        self.event(
+            report["dataset_name"],
+            "dataset",
+            metrics["started"],
+            metrics["wall_seconds"],
+            metrics["pid"],
+            metrics["thread"],
+            args,
+        )
+        started = metrics["started"]
+        for phase, seconds in metrics["phases"].items():
+            self.event(
+                phase, "phase", started, seconds, metrics["pid"], metrics["thread"]
+            )
+            started += seconds
+
+    def close(self):
+        self.file.write("\n]\n")
+        self.file.close()
+
+
+def print_run_summary(combined_summary, failed, report_file_name, slowest=(), limit=10):
+    print(f"Datasets analyzed: {combined_summary.dataset_count}")
+    print(f"Datasets failed: {len(failed)}")
+    for display_name, error in failed[:limit]:
+        print(f"  {display_name}: {error}")
+    if len(failed) > limit:
+        print(f"  ... and {len(failed) - limit} more")
+    if slowest:
+        print("Slowest datasets:")
+        for seconds, display_name, phases in sorted(slowest, reverse=True):
+            print(f"  {display_name}: {seconds:.3f}s ({phases})")
+    print(f"Individual reports written to {report_file_name}")
+
+
+def record_slowest(slowest, report, limit=10):
+    # Keeps the `limit` slowest analyzed datasets in a heap
+    if "duplicate_of" in report or "metrics" not in report:
+        return
+    metrics = report["metrics"]
+    heapq.heappush(
+        slowest,
+        (metrics["wall_seconds"], report["dataset_name"], format_phases(metrics)),
+    )
+    if len(slowest) > limit:
+        heapq.heappop(slowest)
+
+
+def corpus_fingerprint(datasets):
+    # Identifies the dataset list the shards were cut from
+    return hashlib.sha256(json.dumps(datasets, sort_keys=True).encode()).hexdigest()[
+        :16
+    ]
+
+
+def process_datasets(
+    json_file,
+    executor_name="thread",
+    workers=None,
+    cache=None,
+    analysis=None,
+    trace_file=None,
+    memory_budget=None,
+    shard=None,
+    partial_path=None,
+):
+    analysis = analysis or Analysis()
+
+    with open(json_file, "r") as f:
+        datasets = json.load(f)
+    population_count = len(datasets)
+    if analysis.sampling:
+        datasets = analysis.sampling.select_datasets(datasets)
+        print(f"Sampling {len(datasets)} of {population_count} datasets")
+
+    # A shard analyzes its part of the datasets and writes a partial report;
+    # `merge` combines the partial reports of all shards.
+    indexes = list(range(len(datasets)))
+    if shard:
+        try:
+            indexes = shard_datasets(datasets, *shard)
+        except ValueError as e:
+            print(f"Cannot shard: {e}")
+            sys.exit(1)
+        print(
+            f"Shard {shard[0]}/{shard[1]}: {len(indexes)} of {len(datasets)} datasets"
+        )
+        report_file_name = partial_path or PARTIAL_REPORT_PATH.format(*shard)
+        report_writer = PartialReportWriter(
+            report_file_name,
+            {
+                "version": PARTIAL_REPORT_VERSION,
+                "shard": shard[0],
+                "shards": shard[1],
+                "datasets": len(datasets),
+                "population_count": population_count,
+                "corpus": corpus_fingerprint(datasets),
+                "check_set": analysis.check_set_version(),
+                "sampling": analysis.sampling.options() if analysis.sampling else None,
+            },
+        )
+    else:
+        report_file_name = individual_report_file_name()
+        report_writer = ReportWriter(os.path.splitext(report_file_name)[0] + ".jsonl")
+    trace_writer = TraceWriter(trace_file) if trace_file else None
+    combined = CombinedSummary(analysis.sampling, population_count)
+    failed = []
+    slowest = []
+
+    for position, report in iter_datasets(
+        [datasets[index] for index in indexes],
+        analysis,
+        executor_name,
+        workers,
+        cache,
+        memory_budget,
+    ):
+        write_started = time.time()
+        write_start = time.perf_counter()
+        report_writer.write(indexes[position], report)
+        write_seconds = time.perf_counter() - write_start
+        combined.add(report)
+        if "error" in report:
+            failed.append((report["dataset_name"], report["error"]))
+
+        if "duplicate_of" in report:
+            continue
+        record_slowest(slowest, report)
+        if trace_writer:
+            trace_writer.dataset(report)
+            trace_writer.event(
+                "write report",
+                "report",
+                write_started,
+                write_seconds,
+                os.getpid(),
+                threading.get_ident(),
+            )
+    if trace_writer:
+        trace_writer.close()
+    if cache is not None:
+        cache.evict()
+    analysis.evict_parsed_cache()
+
+    if shard:
+        report_writer.close(combined)
+        print_run_summary(combined, failed, report_file_name, slowest)
+        return
+    report_writer.close()
+    write_reports(report_writer, combined, failed, slowest)
+
+
+def individual_report_file_name():
+    if DEBUG:
+        return "individual_dataset_analysis_report_debug.json"
+    return "individual_dataset_analysis_report.json"
+
+
+def write_reports(report_writer, combined, failed, slowest=()):
+    individual_dataset_analysis_report_file_name = individual_report_file_name()
+
+    # Save individual dataset analysis report
+    print("=" * 80)
+    print("Individual Report")
+    print("=" * 80)
+    print("*" * 80)
+    print_run_summary(
+        combined, failed, individual_dataset_analysis_report_file_name, slowest
+    )
+    print("*" * 80)
+    report_writer.write_json(individual_dataset_analysis_report_file_name)
 
     # Generate and save combined analysis report
-    combined_summary = analysis.generate_report(individual_reports)
+    combined_summary = combined.report()
     print("=" * 80)
     print("Combined summery  Report")
     print("=" * 80)
@@ -334,22 +2488,514 @@ def process_datasets(json_file):
     # analysis.generate_charts(combined_summary)
 
 
-def main():
-    if len(sys.argv) != 3:
-        print("Usage: python analysis.py <path_to_json_file>")
+def merge_partial_reports(paths):
+    # Individual and combined reports of all shards, the same as one run over
+    # the whole data info file would write: the reports are put back in input
+    # order and the raw sums of the shards are added up.
+    partials = [read_partial_report(path) for path in paths]
+    first = partials[0][0]
+    for path, (header, _, _) in zip(paths, partials):
+        if {**header, "shard": None} != {**first, "shard": None}:
+            raise ValueError(f"{path} belongs to a different run than {paths[0]}")
+    shards = sorted(header["shard"] for header, _, _ in partials)
+    if shards != list(range(1, first["shards"] + 1)):
+        raise ValueError(f"Expected shards 1 to {first['shards']}, got {shards}")
+
+    sampling = None
+    if first["sampling"]:
+        sampling = Sampling(
+            confidence=first["sampling"]["confidence"],
+            rows=first["sampling"]["rows"],
+            seed=first["sampling"]["seed"],
+        )
+    combined = CombinedSummary(sampling, first["population_count"])
+    report_writer = ReportWriter(
+        os.path.splitext(individual_report_file_name())[0] + ".jsonl"
+    )
+    failed = []
+    slowest = []
+    for _, summary, reports in partials:
+        combined.merge(summary)
+        for index, report in reports:
+            if index in report_writer.offsets:
+                raise ValueError(f"Dataset {index} is in more than one partial report")
+            report_writer.write(index, report)
+            if "error" in report:
+                failed.append((report["dataset_name"], report["error"]))
+            record_slowest(slowest, report)
+    report_writer.close()
+    if len(report_writer.offsets) != first["datasets"]:
+        raise ValueError(
+            f"The shards hold {len(report_writer.offsets)} of {first['datasets']} reports"
+        )
+    write_reports(report_writer, combined, failed, slowest)
+
+
+def file_stamp(file_name):
+    try:
+        stat = os.stat(file_name)
+    except (OSError, TypeError):
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def watch_key(dataset):
+    return json.dumps(
+        [
+            dataset.get("url"),
+            dataset.get("dataset_display_name"),
+            dataset.get("dataset_file_name"),
+        ]
+    )
+
+
+# Watch mode: the data info file and the dataset files are polled, only new
+# or changed files are analyzed, in a pool that stays up between polls, and
+# the combined sums are updated report by report. The reports are written
+# after every poll that changed something and served over a local socket.
+class AnalysisDaemon:
+    def __init__(self, json_file, analysis, executor, cache=None, memory_budget=None):
+        self.json_file = json_file
+        self.analysis = analysis
+        self.executor = executor
+        self.cache = cache
+        self.memory_budget = memory_budget
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.datasets = []
+        self.data_info_stamp = None
+        self.reports = {}
+        self.stamps = {}
+        self.combined = CombinedSummary(analysis.sampling)
+        self.pending = 0
+        self.scans = 0
+        self.last_scan = None
+
+    def read_datasets(self):
+        # A data info file that is being rewritten is read on the next poll
+        stamp = file_stamp(self.json_file)
+        if stamp == self.data_info_stamp:
+            return
+        try:
+            with open(self.json_file, "r") as f:
+                self.datasets = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not read {self.json_file}: {e}")
+            return
+        self.data_info_stamp = stamp
+
+    def scan(self):
+        # Returns the number of reports that were added, replaced or removed
+        self.read_datasets()
+        keys = {watch_key(dataset) for dataset in self.datasets}
+        changes = 0
+        with self.lock:
+            for key in [key for key in self.reports if key not in keys]:
+                self.combined.remove(self.reports.pop(key))
+                del self.stamps[key]
+                changes += 1
+
+        changed = []
+        for dataset in self.datasets:
+            key = watch_key(dataset)
+            stamp = file_stamp(dataset.get("dataset_file_name"))
+            if key not in self.reports or self.stamps[key] != stamp:
+                changed.append((key, dataset, stamp))
+        self.pending = len(changed)
+        reports = []
+        if changed:
+            reports = iter_datasets(
+                [dataset for _, dataset, _ in changed],
+                self.analysis,
+                cache=self.cache,
+                memory_budget=self.memory_budget,
+                executor=self.executor,
+            )
+        for index, report in reports:
+            key, _, stamp = changed[index]
+            with self.lock:
+                if key in self.reports:
+                    self.combined.remove(self.reports[key])
+                self.reports[key] = report
+                self.stamps[key] = stamp
+                self.combined.add(report)
+                self.pending -= 1
+            changes += 1
+
+        self.scans += 1
+        self.last_scan = time.time()
+        if changes:
+            if self.cache is not None:
+                self.cache.evict()
+            self.analysis.evict_parsed_cache()
+        return changes
+
+    def individual_reports(self):
+        with self.lock:
+            return [
+                self.reports[watch_key(dataset)]
+                for dataset in self.datasets
+                if watch_key(dataset) in self.reports
+            ]
+
+    def combined_report(self):
+        with self.lock:
+            return self.combined.report(echo=False)
+
+    def status(self):
+        with self.lock:
+            return {
+                "datasets": len(self.datasets),
+                "analyzed": len(self.reports),
+                "pending": self.pending,
+                "scans": self.scans,
+                "last_scan": self.last_scan,
+            }
+
+    def write_reports(self):
+        with open(individual_report_file_name(), "w") as f:
+            json.dump(self.individual_reports(), f, indent=4)
+        with open("combined_dataset_analysis_report.json", "w") as f:
+            json.dump(self.combined_report(), f, indent=4)
+
+    def respond(self, request):
+        # One command per line: combined, reports, report <dataset name>,
+        # status or rescan. Every answer is one line of JSON.
+        command, _, argument = request.strip().partition(" ")
+        if command == "combined":
+            return self.combined_report()
+        if command == "reports":
+            return self.individual_reports()
+        if command == "report":
+            for report in self.individual_reports():
+                if argument in (report["dataset_name"], report["dataset_file_path"]):
+                    return report
+            return {"error": f"No report for {argument}"}
+        if command == "status":
+            return self.status()
+        if command == "rescan":
+            self.wake.set()
+            return {"rescan": True}
+        return {"error": f"Unknown command: {command}"}
+
+    def serve(self, socket_path=DAEMON_SOCKET_PATH, interval=WATCH_INTERVAL):
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    response = daemon.respond(line.decode("utf-8", "replace"))
+                    self.wfile.write(json.dumps(response).encode() + b"\n")
+
+        # A socket left behind by a daemon that did not shut down cleanly
+        if os.path.exists(socket_path) and S_ISSOCK(os.stat(socket_path).st_mode):
+            os.remove(socket_path)
+        server = socketserver.ThreadingUnixStreamServer(socket_path, Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"Watching {self.json_file}, answering on {socket_path}")
+        # Stopped with Ctrl+C or SIGTERM; both remove the socket
+        signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+        try:
+            while True:
+                changes = self.scan()
+                if changes:
+                    self.write_reports()
+                    status = self.status()
+                    print(
+                        f"{time.strftime('%H:%M:%S')} {changes} reports updated, "
+                        f"{status['analyzed']} of {status['datasets']} datasets analyzed"
+                    )
+                self.wake.wait(interval)
+                self.wake.clear()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.shutdown()
+            server.server_close()
+            os.remove(socket_path)
+
+
+def query_daemon(command, socket_path=DAEMON_SOCKET_PATH):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall(command.encode() + b"\n")
+        with client.makefile("rb") as f:
+            return json.loads(f.readline())
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Run data quality checks on the datasets in a data info file."
+    )
+    parser.add_argument("json_file", nargs="?", help="path to the data info json file")
+    parser.add_argument("-d", "--debug", action="store_true", help="debug mode")
+    parser.add_argument(
+        "--executor",
+        choices=sorted(EXECUTORS),
+        default="thread",
+        help="run datasets in a thread pool or a process pool",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="number of pool workers"
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=parse_size,
+        default=None,
+        help="admit datasets only while their estimated memory fits (e.g. 4G)",
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        default=None,
+        help="analyze only shard i of N (e.g. 2/4) and write a partial report "
+        "for `merge`",
+    )
+    parser.add_argument(
+        "--partial-output",
+        default=None,
+        help="partial report file of the shard (default partial_report_<i>_of_<N>.jsonl)",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="keep running: analyze new and changed files as they appear and "
+        "answer report requests on --socket",
+    )
+    parser.add_argument(
+        "--socket",
+        default=DAEMON_SOCKET_PATH,
+        help="local socket of the watch mode (see `analysis.py query`)",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=WATCH_INTERVAL,
+        help="seconds between two checks for changed files in watch mode",
+    )
+    parser.add_argument(
+        "--checks",
+        nargs="+",
+        choices=[check.key for check in CHECKS],
+        default=None,
+        help="run only these checks; only the columns they need are loaded",
+    )
+    parser.add_argument(
+        "--unique-mode",
+        choices=UNIQUE_MODES,
+        default="exact",
+        help="count distinct identifiers exactly or with a HyperLogLog sketch",
+    )
+    parser.add_argument(
+        "--unique-error",
+        type=float,
+        default=0.01,
+        help="relative error target of the HyperLogLog sketch",
+    )
+    parser.add_argument(
+        "--unique-key",
+        type=int,
+        nargs="+",
+        default=[0],
+        help="column positions that together form the identifier",
+    )
+    parser.add_argument(
+        "--sample",
+        action="store_true",
+        help="analyze a uniform row sample of every file and report confidence intervals",
+    )
+    parser.add_argument(
+        "--sample-error",
+        type=float,
+        default=SAMPLE_ERROR,
+        help="absolute error target of the sampled percentages (0.01 = 1 point)",
+    )
+    parser.add_argument(
+        "--sample-rows",
+        type=int,
+        default=None,
+        help="rows sampled per file instead of sizing them from --sample-error",
+    )
+    parser.add_argument(
+        "--sample-files",
+        type=float,
+        default=None,
+        help="analyze only this fraction of the files, stratified by file size",
+    )
+    parser.add_argument(
+        "--confidence",
+        type=float,
+        default=SAMPLE_CONFIDENCE,
+        help="confidence level of the sampled intervals",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="seed of the row and file samples"
+    )
+    parser.add_argument(
+        "--csv-backend",
+        choices=["auto"] + sorted(CSV_BACKENDS),
+        default=CSV_BACKEND,
+        help="CSV parser; auto uses the multithreaded Arrow parser for files up to "
+        "64 MiB when pyarrow is installed",
+    )
+    parser.add_argument(
+        "--trace",
+        default=None,
+        help="write per dataset phase timings to this Chrome trace file",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="record the tracemalloc peak per dataset (use with --workers 1)",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="do not use the result cache"
+    )
+    parser.add_argument(
+        "--clear-cache", action="store_true", help="invalidate the result cache"
+    )
+    parser.add_argument(
+        "--cache-dir", default=RESULT_CACHE_DIR, help="result cache directory"
+    )
+    parser.add_argument(
+        "--no-parsed-cache",
+        action="store_true",
+        help="parse the source files again instead of reading their binary copy",
+    )
+    parser.add_argument(
+        "--parsed-cache-dir",
+        default=PARSED_CACHE_DIR,
+        help="directory for the binary copies of parsed files",
+    )
+    args = parser.parse_args()
+    if args.json_file is None and not args.clear_cache:
+        parser.error("the json_file argument is required")
+    if args.csv_backend == "arrow" and not arrow_available():
+        parser.error("the arrow CSV backend needs pyarrow to be installed")
+    if args.watch and (args.shard or args.sample_files):
+        parser.error("--watch analyzes all datasets, without --shard or --sample-files")
+    return args
+
+
+def parse_merge_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="analysis.py merge",
+        description="Combine the partial reports of a sharded run into the "
+        "individual and combined reports.",
+    )
+    parser.add_argument("partial_reports", nargs="+", help="partial report files")
+    parser.add_argument("-d", "--debug", action="store_true", help="debug mode")
+    return parser.parse_args(argv)
+
+
+def merge_main(argv):
+    global DEBUG
+    args = parse_merge_args(argv)
+    DEBUG = args.debug
+    try:
+        merge_partial_reports(args.partial_reports)
+    except (OSError, ValueError) as e:
+        print(f"Cannot merge: {e}")
+        sys.exit(1)
+
+
+def parse_query_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="analysis.py query",
+        description="Ask a running `analysis.py --watch` for its reports.",
+    )
+    parser.add_argument(
+        "command",
+        nargs="+",
+        help="combined, reports, report <dataset name>, status or rescan",
+    )
+    parser.add_argument(
+        "--socket", default=DAEMON_SOCKET_PATH, help="socket of the watch mode"
+    )
+    return parser.parse_args(argv)
+
+
+def query_main(argv):
+    args = parse_query_args(argv)
+    try:
+        response = query_daemon(" ".join(args.command), args.socket)
+    except OSError as e:
+        print(f"No analysis daemon on {args.socket}: {e}")
         sys.exit(1)
+    print(json.dumps(response, indent=4))
 
-    json_file = sys.argv[1]
-    debug_flag = str(sys.argv[2])
-    if debug_flag == "-d":
+
+def main():
+    global DEBUG
+    if sys.argv[1:2] == ["merge"]:
+        return merge_main(sys.argv[2:])
+    if sys.argv[1:2] == ["query"]:
+        return query_main(sys.argv[2:])
+    args = parse_args()
+
+    json_file = args.json_file
+    if args.debug:
         print("IN DEBUG MODE")
         DEBUG = True
 
+    cache = None if args.no_cache else ResultCache(args.cache_dir)
+    if args.clear_cache:
+        ResultCache(args.cache_dir).clear()
+        clear_parsed_cache(args.parsed_cache_dir)
+        print(f"Cleared caches: {args.cache_dir}, {args.parsed_cache_dir}")
+        if json_file is None:
+            return
+
     if not os.path.isfile(json_file):
         print(f"File not found: {json_file}")
         sys.exit(1)
 
-    process_datasets(json_file)
+    checks = [check for check in CHECKS if not args.checks or check.key in args.checks]
+    checks = [
+        (
+            UniqueIdentifierAccumulator(
+                args.unique_mode, args.unique_error, args.unique_key
+            )
+            if check is UniqueIdentifierAccumulator
+            else check
+        )
+        for check in checks
+    ]
+    sampling = None
+    if args.sample or args.sample_rows or args.sample_files:
+        sampling = Sampling(
+            args.sample_error,
+            args.confidence,
+            args.sample_rows,
+            args.sample_files,
+            args.seed,
+        )
+    analysis = Analysis(
+        checks=checks,
+        parsed_cache_dir=None if args.no_parsed_cache else args.parsed_cache_dir,
+        trace_memory=args.trace_memory,
+        sampling=sampling,
+        csv_backend=args.csv_backend,
+    )
+    if args.watch:
+        with EXECUTORS[args.executor](max_workers=args.workers) as executor:
+            AnalysisDaemon(
+                json_file, analysis, executor, cache, args.memory_budget
+            ).serve(args.socket, args.poll_interval)
+        return
+
+    process_datasets(
+        json_file,
+        args.executor,
+        args.workers,
+        cache,
+        analysis,
+        args.trace,
+        args.memory_budget,
+        args.shard,
+        args.partial_output,
+    )
 
 
 if __name__ == "__main__":
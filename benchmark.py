@@ -0,0 +1,349 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import analysis
+
+RESULTS_FILE = "benchmark_results.json"
+DATA_DIR = "benchmark_data"
+REPEAT = 3
+REGRESSION_THRESHOLD = 0.2  # 20% slower than the baseline
+
+# Synthetic datasets shaped like the Leipzig files: narrow and wide tables,
+# sparse columns, object columns mixing numbers/dates/text, latin-1 and
+# Windows-1252 files and ';' delimited files with decimal commas.
+CASES = [
+    {"name": "small_narrow", "rows": 10000, "columns": 5},
+    {"name": "medium_wide", "rows": 50000, "columns": 40},
+    {"name": "large", "rows": 200000, "columns": 20},
+    {"name": "null_heavy", "rows": 50000, "columns": 10, "null_density": 0.5},
+    {"name": "mixed_types", "rows": 50000, "columns": 10, "mixed": True},
+    {
+        "name": "latin1_semicolon",
+        "rows": 50000,
+        "columns": 10,
+        "encoding": "ISO-8859-1",
+        "sep": ";",
+        "decimal": ",",
+    },
+    {
+        "name": "cp1252_mixed",
+        "rows": 20000,
+        "columns": 10,
+        "encoding": "Windows-1252",
+        "mixed": True,
+    },
+]
+
+WORDS = ["Leipzig", "Mitte", "Süd", "Grünau", "Möckern", "Plagwitz", "Straße"]
+CP1252_WORDS = ["Zentrum – Nord", "„Altbau“", "Preis in €"]
+
+
+def generate_column(rng, rows, kind, case):
+    if kind == "int":
+        values = pd.Series(rng.integers(0, 100000, rows))
+    elif kind == "float":
+        values = pd.Series(rng.normal(1000, 250, rows).round(2))
+    elif kind == "text":
+        words = WORDS + (CP1252_WORDS if case.get("encoding") == "Windows-1252" else [])
+        values = pd.Series(rng.choice(words, rows))
+    elif kind == "date":
+        days = rng.integers(0, 3650, rows)
+        values = pd.Series(pd.Timestamp("2014-01-01") + pd.to_timedelta(days, "D"))
+        values = values.dt.strftime("%d.%m.%Y")
+    else:
+        values = pd.Series(
+            rng.choice(["12", "3.5", "2021-05-01", "ja", "k.A.", "Leipzig"], rows)
+        )
+
+    null_density = case.get("null_density", 0.05)
+    if null_density:
+        values = values.astype(object)
+        values[rng.random(rows) < null_density] = None
+    return values
+
+
+def generate_case(case, data_dir):
+    file_name = os.path.join(data_dir, f"{case['name']}.csv")
+    if os.path.exists(file_name):
+        return file_name
+
+    rng = np.random.default_rng(len(case["name"]))
+    kinds = ["int", "float", "text", "date"]
+    if case.get("mixed"):
+        kinds.append("mixed")
+    df = pd.DataFrame(
+        {
+            f"col_{position}": generate_column(
+                rng, case["rows"], kinds[position % len(kinds)], case
+            )
+            for position in range(case["columns"])
+        }
+    )
+    # The first column is the identifier, with some duplicates
+    df.insert(0, "id", rng.integers(0, case["rows"], case["rows"]))
+
+    os.makedirs(data_dir, exist_ok=True)
+    df.to_csv(
+        file_name,
+        index=False,
+        encoding=case.get("encoding", "utf-8"),
+        sep=case.get("sep", ","),
+        decimal=case.get("decimal", "."),
+    )
+    return file_name
+
+
+def measure(func, repeat=REPEAT):
+    # Best wall time of `repeat` runs, then one more run under tracemalloc
+    # for the peak of Python allocations (numpy and pandas buffers included).
+    seconds = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        seconds = min(seconds, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return seconds, peak_memory
+
+
+def result_entry(case, benchmark, seconds, peak_memory, cells):
+    return {
+        "case": case["name"],
+        "benchmark": benchmark,
+        "seconds": seconds,
+        "cells": cells,
+        "cells_per_second": cells / seconds if seconds else None,
+        "peak_memory_bytes": peak_memory,
+    }
+
+
+def process_datasets_quietly(json_file, analysis_instance):
+    with tempfile.TemporaryDirectory() as output_dir:
+        cwd = os.getcwd()
+        os.chdir(output_dir)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(
+                io.StringIO()
+            ):
+                analysis.process_datasets(
+                    json_file, analysis=analysis_instance, cache=None
+                )
+        finally:
+            os.chdir(cwd)
+
+
+def benchmark_case(case, data_dir, repeat, backend=analysis.CSV_BACKEND):
+    file_name = os.path.abspath(generate_case(case, data_dir))
+    results = []
+
+    df = analysis.load_dataset(file_name, parsed_cache_dir=None, backend=backend)
+    cells = int(df.size)
+
+    seconds, peak_memory = measure(
+        lambda: analysis.load_dataset(
+            file_name, parsed_cache_dir=None, backend=backend
+        ),
+        repeat,
+    )
+    results.append(result_entry(case, "load_dataset", seconds, peak_memory, cells))
+
+    checker = analysis.Analysis(parsed_cache_dir=None, csv_backend=backend)
+    for name in [
+        "check_missing_values",
+        "check_null_values",
+        "check_data_types",
+        "check_unique_identifier",
+    ]:
+        check = getattr(checker, name)
+        seconds, peak_memory = measure(lambda: check(df), repeat)
+        results.append(result_entry(case, name, seconds, peak_memory, cells))
+
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump(
+            [{"dataset_display_name": case["name"], "dataset_file_name": file_name}], f
+        )
+    try:
+        seconds, peak_memory = measure(
+            lambda: process_datasets_quietly(f.name, checker), repeat
+        )
+    finally:
+        os.remove(f.name)
+    results.append(result_entry(case, "process_datasets", seconds, peak_memory, cells))
+    return results
+
+
+def selected_cases(args):
+    cases = [case for case in CASES if not args.cases or case["name"] in args.cases]
+    if args.quick:
+        cases = [dict(case, rows=case["rows"] // 10) for case in cases]
+    return cases, os.path.join(args.data_dir, "quick" if args.quick else "full")
+
+
+def pyarrow_version():
+    if not analysis.arrow_available():
+        return None
+    import pyarrow
+
+    return pyarrow.__version__
+
+
+def run(args):
+    cases, data_dir = selected_cases(args)
+
+    results = []
+    for case in cases:
+        print(f"Benchmarking {case['name']} ({case['rows']} rows)...")
+        for entry in benchmark_case(case, data_dir, args.repeat, args.csv_backend):
+            results.append(entry)
+            print(
+                f"  {entry['benchmark']:<26} {entry['seconds']:9.4f}s "
+                f"{entry['cells_per_second']:14,.0f} cells/s "
+                f"{entry['peak_memory_bytes'] / 2**20:9.1f} MiB"
+            )
+
+    output = {
+        "meta": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "quick": args.quick,
+            "csv_backend": args.csv_backend,
+            "pyarrow": pyarrow_version(),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=4)
+    print(f"Results written to {args.output}")
+
+
+def compare_backends(args):
+    # Every CSV backend has to give the same check results on every case
+    if not analysis.arrow_available():
+        print("pyarrow is not installed, only the pandas backend is available")
+        return 1
+    cases, data_dir = selected_cases(args)
+    differences = 0
+    for case in cases:
+        file_name = generate_case(case, data_dir)
+        results = {
+            backend: analysis.analyze_dataset(
+                file_name,
+                analysis.Analysis(parsed_cache_dir=None, csv_backend=backend),
+            )
+            for backend in sorted(analysis.CSV_BACKENDS)
+        }
+        same = all(result == results["pandas"] for result in results.values())
+        print(f"{case['name']:<18} {'same' if same else 'DIFFERENT'}")
+        if not same:
+            differences += 1
+            for backend, result in results.items():
+                print(f"  {backend}: {result}")
+
+    print(f"Cases with different results: {differences}")
+    return 1 if differences else 0
+
+
+def compare(args):
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+    with open(args.current, "r") as f:
+        current = json.load(f)
+
+    baseline_results = {
+        (entry["case"], entry["benchmark"]): entry for entry in baseline["results"]
+    }
+    regressions = 0
+    for entry in current["results"]:
+        old = baseline_results.get((entry["case"], entry["benchmark"]))
+        if old is None:
+            continue
+        ratio = entry["seconds"] / old["seconds"] if old["seconds"] else 1.0
+        status = ""
+        if ratio > 1 + args.threshold:
+            status = "REGRESSION"
+            regressions += 1
+        elif ratio < 1 - args.threshold:
+            status = "improved"
+        print(
+            f"{entry['case']:<18} {entry['benchmark']:<26} "
+            f"{old['seconds']:9.4f}s -> {entry['seconds']:9.4f}s "
+            f"({ratio:5.2f}x) {status}"
+        )
+
+    print(f"Regressions: {regressions}")
+    return 1 if regressions else 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the loaders and quality checks on synthetic data."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--output", default=RESULTS_FILE)
+    run_parser.add_argument("--data-dir", default=DATA_DIR)
+    run_parser.add_argument("--repeat", type=int, default=REPEAT)
+    run_parser.add_argument(
+        "--quick", action="store_true", help="use a tenth of the rows"
+    )
+    run_parser.add_argument(
+        "--cases", nargs="+", choices=[case["name"] for case in CASES]
+    )
+    run_parser.add_argument(
+        "--csv-backend",
+        choices=["auto"] + sorted(analysis.CSV_BACKENDS),
+        default=analysis.CSV_BACKEND,
+    )
+
+    backends_parser = subparsers.add_parser(
+        "backends", help="check that all CSV backends give the same results"
+    )
+    backends_parser.add_argument("--data-dir", default=DATA_DIR)
+    backends_parser.add_argument(
+        "--quick", action="store_true", help="use a tenth of the rows"
+    )
+    backends_parser.add_argument(
+        "--cases", nargs="+", choices=[case["name"] for case in CASES]
+    )
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="compare two result files and flag regressions"
+    )
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.command == "run":
+        run(args)
+    elif args.command == "backends":
+        sys.exit(compare_backends(args))
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,18 @@
+import argparse
+import email.utils
 import os
 import random
+import re
+import hashlib
+import tempfile
+import threading
 import time
+import concurrent.futures
+from collections import deque
+from datetime import datetime, timezone
 import requests
-from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 from pprint import pprint
 from tqdm import tqdm
@@ -12,13 +22,64 @@ from urllib.parse import urlparse
 BASE_URL = "https://opendata.leipzig.de"
 DOWNLOAD_FOLDER_PATH = "datasets"
 MAX_RETRIES = 3
-RETRY_DELAY = 5  # seconds
-
-
-def get_data_for_dataset(dataset_id: str):
-    dataset_response = requests.get(
-        f"{BASE_URL}/api/3/action/package_show?id={dataset_id}"
+REQUEST_TIMEOUT = 30  # seconds
+CRAWL_WORKERS = 8
+DOWNLOAD_CHUNK_SIZE = 64 * 1024  # bytes
+DATA_INFO_PATH = "data_info.json"
+CHANGED_DATASETS_PATH = "changed_datasets.json"
+JOURNAL_PATH = "data_info_journal.jsonl"
+RETRY_STATUSES = [408, 429, 500, 502, 503, 504]
+# Downloads are stored under their sha256 with one of these extensions
+BLOB_EXTENSIONS = [".csv", ".xlsx", ".json"]
+BLOB_PATTERN = re.compile(r"[0-9a-f]{64}\.\w+")
+# Download scheduler: parallel requests and requests per second per host,
+# exponential backoff with jitter between retries (seconds)
+HOST_CONCURRENCY = 2
+HOST_RATE = 2.0
+HOST_BURST = 2
+MIN_HOST_RATE = 0.1
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+RETRY_AFTER_MAX = 300.0
+# The umask can only be read by setting it, so it is read once here rather
+# than while download threads create files.
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+
+def create_session(pool_size: int = CRAWL_WORKERS, retries: bool = True):
+    # Keep-alive connections are reused across calls; transient failures are
+    # retried by the adapter with exponential backoff unless the caller does
+    # its own retries.
+    retry = Retry(
+        total=MAX_RETRIES,
+        backoff_factor=1,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=["GET", "HEAD"],
     )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=retry if retries else 0,
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_data_for_dataset(dataset_id: str, session=None, base_url: str = BASE_URL):
+    session = session or requests
+    try:
+        dataset_response = session.get(
+            f"{base_url}/api/3/action/package_show",
+            params={"id": dataset_id},
+            timeout=REQUEST_TIMEOUT,
+        )
+    except requests.exceptions.RequestException as e:
+        print(f"ERROR: Could not get the data of dataset_id: {dataset_id}")
+        print(f"REQUEST_ERROR: {e}")
+        return None
     if dataset_response.status_code == 200:
         dataset_response_json = dataset_response.json()
         dataset_info = dataset_response_json.get("result")
@@ -58,32 +119,442 @@ def download_csv(url: str, folder_path: str = DOWNLOAD_FOLDER_PATH):
  """
 
 
-def download_csv(url: str, folder_path: str = DOWNLOAD_FOLDER_PATH):
-    os.makedirs(folder_path, exist_ok=True)
-
-    for attempt in range(MAX_RETRIES):
+def blob_path(folder_path: str, sha256: str, extension: str = ".csv"):
+    return os.path.join(folder_path, f"{sha256}{extension}")
+
+
+def apply_umask(path: str):
+    # mkstemp creates files readable by the owner only; files moved into
+    # place get the mode open() would have given them.
+    os.chmod(path, 0o666 & ~UMASK)
+
+
+def write_response(response, folder_path: str, extension: str = ".csv"):
+    # Stream the body into a temp file in the store while hashing it, then
+    # move it into place under its content hash, so a crash never leaves a
+    # truncated file behind and identical downloads share one file.
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=folder_path, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                file.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+            file.flush()
+            os.fsync(file.fileno())
+        file_path = blob_path(folder_path, digest.hexdigest(), extension)
+        if os.path.exists(file_path):
+            os.remove(temp_path)
+        else:
+            apply_umask(temp_path)
+            os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return {"file_path": file_path, "sha256": digest.hexdigest(), "size": size}
+
+
+def url_extension(url: str):
+    # The analysis picks its loader by extension; anything else is read as csv
+    extension = os.path.splitext(urlparse(url).path)[1].lower()
+    return extension if extension in BLOB_EXTENSIONS else ".csv"
+
+
+def save_response(response, url: str, folder_path: str):
+    if response.status_code == 304:
+        return {"not_modified": True}
+    response.raise_for_status()
+
+    download = write_response(response, folder_path, url_extension(url))
+    download["etag"] = response.headers.get("ETag")
+    download["last_modified"] = response.headers.get("Last-Modified")
+    return download
+
+
+def retry_after_seconds(response):
+    # Retry-After is either a number of seconds or an HTTP date
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
         try:
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-
-            filename = os.path.basename(urlparse(url).path)
-            if not filename or not filename.lower().endswith(".csv"):
-                filename = f"downloaded_file_{str(random.randint(111,9999999))}.csv"
-
-            file_path = os.path.join(folder_path, filename)
+            when = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        seconds = (when - datetime.now(timezone.utc)).total_seconds()
+    return min(max(seconds, 0.0), RETRY_AFTER_MAX)
+
+
+class TokenBucket:
+    # `rate` requests per second with bursts of up to `burst` requests. A
+    # caller takes a token and is told how long to wait before using it, so
+    # waiting happens outside the lock.
+    def __init__(self, rate: float, burst: int = 1, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.clock = clock
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+
+class HostState:
+    # Limits of one host: concurrent requests, request rate and a pause set by
+    # Retry-After. The rate is halved when the host asks us to slow down
+    # (429/503) and recovers by a tenth of the configured rate per success.
+    def __init__(self, concurrency: int, rate: float, burst: int, clock=time.monotonic):
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.bucket = TokenBucket(rate, burst, clock)
+        self.max_rate = rate
+        self.clock = clock
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def wait_time(self):
+        with self.lock:
+            pause = self.paused_until - self.clock()
+        return max(pause, self.bucket.reserve())
+
+    def pause(self, seconds: float):
+        with self.lock:
+            self.paused_until = max(self.paused_until, self.clock() + seconds)
+
+    def slow_down(self):
+        with self.bucket.lock:
+            self.bucket.rate = max(self.bucket.rate / 2, MIN_HOST_RATE)
+
+    def speed_up(self):
+        with self.bucket.lock:
+            self.bucket.rate = min(self.bucket.rate + self.max_rate / 10, self.max_rate)
+
+
+class DownloadScheduler:
+    # Downloads run in parallel across hosts but at most `concurrency` at a
+    # time and `rate` per second for each host. Connection errors, 408, 429
+    # and 5xx responses are retried with exponential backoff and full jitter,
+    # or after the Retry-After the server sent, which pauses the whole host.
+    def __init__(
+        self,
+        concurrency: int = HOST_CONCURRENCY,
+        rate: float = HOST_RATE,
+        burst: int = HOST_BURST,
+        max_retries: int = MAX_RETRIES,
+        backoff_base: float = BACKOFF_BASE,
+        backoff_max: float = BACKOFF_MAX,
+        sleep=time.sleep,
+        clock=time.monotonic,
+    ):
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.sleep = sleep
+        self.clock = clock
+        self.hosts = {}
+        self.lock = threading.Lock()
+        self.session = create_session(max(CRAWL_WORKERS, concurrency), retries=False)
+
+    def host(self, url: str):
+        key = urlparse(url).netloc
+        with self.lock:
+            if key not in self.hosts:
+                self.hosts[key] = HostState(
+                    self.concurrency, self.rate, self.burst, self.clock
+                )
+            return self.hosts[key]
+
+    def backoff(self, attempt: int):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    def download(
+        self,
+        url: str,
+        folder_path: str = DOWNLOAD_FOLDER_PATH,
+        headers: dict = None,
+    ):
+        os.makedirs(folder_path, exist_ok=True)
+        host = self.host(url)
+
+        for attempt in range(self.max_retries):
+            retry_after = None
+            with host.slots:
+                self.sleep(host.wait_time())
+                try:
+                    with self.session.get(
+                        url, headers=headers, timeout=REQUEST_TIMEOUT, stream=True
+                    ) as response:
+                        if response.status_code not in RETRY_STATUSES:
+                            download = save_response(response, url, folder_path)
+                            host.speed_up()
+                            return download
+                        error = f"HTTP {response.status_code}"
+                        retry_after = retry_after_seconds(response)
+                        if response.status_code in (429, 503):
+                            host.slow_down()
+                except requests.exceptions.HTTPError as e:
+                    print(f"Error downloading {url}: {e}")
+                    return None
+                except requests.exceptions.RequestException as e:
+                    error = e
+
+            print(f"Error downloading {url}: {error}")
+            if attempt == self.max_retries - 1:
+                break
+            if retry_after is not None:
+                host.pause(retry_after)
+                delay = retry_after
+            else:
+                delay = self.backoff(attempt)
+            print(f"Retrying in {delay:.1f} seconds...")
+            self.sleep(delay)
+
+        print(f"Max retries reached. Skipping {url}")
+        return None
+
+    def map(self, items: list, download):
+        # Calls download(item) for every item, keeping up to `concurrency`
+        # items of every host in flight, and yields (item, result) as they
+        # finish. Items of a busy host never hold up the other hosts.
+        queues = {}
+        for item in items:
+            queues.setdefault(urlparse(item.get("url")).netloc, deque()).append(item)
+
+        workers = max(1, self.concurrency * len(queues))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+
+            def submit(key):
+                item = queues[key].popleft()
+                futures[executor.submit(download, item)] = (key, item)
+
+            for key, pending in queues.items():
+                for _ in range(min(self.concurrency, len(pending))):
+                    submit(key)
+            while futures:
+                done, _ = concurrent.futures.wait(
+                    futures, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    key, item = futures.pop(future)
+                    if queues[key]:
+                        submit(key)
+                    yield item, future.result()
+
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+
+def default_scheduler():
+    # Shared by all download_csv calls of the process so the host limits hold
+    # across threads.
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = DownloadScheduler()
+        return _default_scheduler
+
+
+def download_csv(
+    url: str,
+    folder_path: str = DOWNLOAD_FOLDER_PATH,
+    headers: dict = None,
+    scheduler: DownloadScheduler = None,
+):
+    scheduler = scheduler or default_scheduler()
+    return scheduler.download(url, folder_path, headers)
+
+
+def dataset_entry(item: dict, download: dict):
+    return {
+        "dataset_display_name": item.get("dataset_display_title"),
+        "dataset_file_name": download["file_path"],
+        "url": item.get("url"),
+        "sha256": download["sha256"],
+        "size": download["size"],
+        "etag": download.get("etag"),
+        "last_modified": download.get("last_modified"),
+    }
+
+
+def conditional_headers(entry: dict):
+    # Validators are only sent while the local copy is intact, otherwise a 304
+    # would leave a missing or damaged file in place.
+    file_name = entry.get("dataset_file_name")
+    if not file_name or not os.path.isfile(file_name):
+        return {}
+    if entry.get("size") is not None and os.path.getsize(file_name) != entry["size"]:
+        return {}
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+def append_to_journal(entry: dict, journal_path: str = JOURNAL_PATH):
+    # One json object per line, flushed to disk before the next download
+    # starts. A crash can at most leave a partial last line, which
+    # read_journal skips; the next entry starts on a fresh line after it.
+    prefix = ""
+    if os.path.exists(journal_path) and os.path.getsize(journal_path) > 0:
+        with open(journal_path, "rb") as journal:
+            journal.seek(-1, os.SEEK_END)
+            if journal.read(1) != b"\n":
+                prefix = "\n"
+    with open(journal_path, "a", encoding="utf-8") as journal:
+        journal.write(prefix + json.dumps(entry) + "\n")
+        journal.flush()
+        os.fsync(journal.fileno())
+
+
+def read_journal(journal_path: str = JOURNAL_PATH):
+    entries_by_url = {}
+    if not os.path.exists(journal_path):
+        return entries_by_url
+    with open(journal_path, "r", encoding="utf-8") as journal:
+        for line in journal:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Skipping incomplete journal line: {line.strip()[:80]}")
+                continue
+            entries_by_url[entry.get("url")] = entry
+    return entries_by_url
+
+
+def seed_journal(
+    dataset_download_list: list,
+    data_info_path: str = DATA_INFO_PATH,
+    journal_path: str = JOURNAL_PATH,
+):
+    # Older data_info.json files have no url per entry; they were written in
+    # download list order, which is what the index based resume relied on.
+    if os.path.exists(journal_path) or not os.path.exists(data_info_path):
+        return
+    with open(data_info_path, "r") as f:
+        data_info = json.load(f)
+    for index, entry in enumerate(data_info):
+        if not entry.get("url") and index < len(dataset_download_list):
+            entry["url"] = dataset_download_list[index].get("url")
+        append_to_journal(entry, journal_path)
+
+
+def write_json_atomic(path: str, data):
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        f.write(json.dumps(data, indent=4) + "\n")
+    apply_umask(temp_path)
+    os.replace(temp_path, path)
+
+
+def compact_journal(
+    dataset_download_list: list,
+    data_info_path: str = DATA_INFO_PATH,
+    journal_path: str = JOURNAL_PATH,
+):
+    # Keep the latest entry per url, ordered like the download list, and
+    # rewrite both the journal and data_info.json from it.
+    entries_by_url = read_journal(journal_path)
+    urls = [item.get("url") for item in dataset_download_list]
+    urls += [url for url in entries_by_url if url not in set(urls)]
+    data_info = [entries_by_url[url] for url in urls if url in entries_by_url]
+
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(journal_path) or ".", suffix=".tmp"
+    )
+    with os.fdopen(fd, "w", encoding="utf-8") as journal:
+        for entry in data_info:
+            journal.write(json.dumps(entry) + "\n")
+    apply_umask(temp_path)
+    os.replace(temp_path, journal_path)
+    write_json_atomic(data_info_path, data_info)
+    return data_info
+
+
+def prune_blobs(data_info: list, folder_path: str = DOWNLOAD_FOLDER_PATH):
+    # Remove stored files no catalog entry points at anymore, e.g. the old
+    # content of a refreshed resource. Only content-hash named files are
+    # touched.
+    referenced = {
+        os.path.abspath(entry["dataset_file_name"])
+        for entry in data_info
+        if entry.get("dataset_file_name")
+    }
+    removed = 0
+    if not os.path.isdir(folder_path):
+        return removed
+    for file in os.scandir(folder_path):
+        if (
+            BLOB_PATTERN.fullmatch(file.name)
+            and os.path.abspath(file.path) not in referenced
+        ):
+            os.remove(file.path)
+            removed += 1
+    return removed
+
+
+def refresh_datasets(
+    dataset_download_list: list,
+    entries_by_url: dict,
+    journal_path: str = JOURNAL_PATH,
+    scheduler: DownloadScheduler = None,
+):
+    scheduler = scheduler or default_scheduler()
+    changed = []
+    not_modified_count = 0
+
+    def refresh(item):
+        entry = entries_by_url.get(item.get("url"), {})
+        return download_csv(
+            item.get("url"),
+            headers=conditional_headers(entry),
+            scheduler=scheduler,
+        )
+
+    print("Refreshing datasets...")
+    positions = {
+        id(item): position for position, item in enumerate(dataset_download_list)
+    }
+    for item, download in tqdm(
+        scheduler.map(dataset_download_list, refresh),
+        total=len(dataset_download_list),
+    ):
+        if download is None:
+            continue
+        if download.get("not_modified"):
+            not_modified_count += 1
+            continue
+        data = dataset_entry(item, download)
+        append_to_journal(data, journal_path)
+        if download["sha256"] != entries_by_url.get(item.get("url"), {}).get("sha256"):
+            changed.append((positions[id(item)], data))
 
-            with open(file_path, "wb") as file:
-                file.write(response.content)
+    # Listed in download list order, whichever finished first
+    changed = [data for _, data in sorted(changed, key=lambda change: change[0])]
 
-            return file_path
-        except requests.exceptions.RequestException as e:
-            print(f"Error downloading {url}: {e}")
-            if attempt < MAX_RETRIES - 1:
-                print(f"Retrying in {RETRY_DELAY} seconds...")
-                time.sleep(RETRY_DELAY)
-            else:
-                print(f"Max retries reached. Skipping {url}")
-                return None
+    print(f"Not modified: {not_modified_count}, changed or new: {len(changed)}")
+    for data in changed:
+        print(f"CHANGED: {data['dataset_display_name']}")
+    return changed
 
 
 def get_data_for_gorup_dataset(dataset_id: str):
@@ -98,16 +569,22 @@ def get_data_for_gorup_dataset(dataset_id: str):
 
 
 # Function to fetch datasets from the CKAN API
-def fetch_datasets(datset_list_name: str = None):
+def fetch_datasets(
+    datset_list_name: str = None,
+    base_url: str = BASE_URL,
+    workers: int = CRAWL_WORKERS,
+):
     datasets = []
-    PACKAGE_LIST_URL = f"{BASE_URL}/api/3/action/package_list"
-    URL = f"{BASE_URL}/api/3/action/group_list"
+    PACKAGE_LIST_URL = f"{base_url}/api/3/action/package_list"
+    URL = f"{base_url}/api/3/action/group_list"
 
     if datset_list_name == "PACKAGE_LIST_URL":
         URL = PACKAGE_LIST_URL
 
+    session = create_session(workers)
+
     # Get JSON-formatted list of datasets
-    response = requests.get(URL)
+    response = session.get(URL, timeout=REQUEST_TIMEOUT)
 
     data = response.json()
     # print("*"*80)
@@ -122,11 +599,19 @@ def fetch_datasets(datset_list_name: str = None):
         print(f"TOTAL DATASET COUNT: {dataset_count}")
         csv_count = 0
         print("Fetching datasets information...")
-        for dataset_id in tqdm(dataset_ids):
-            info_about_dataset = get_data_for_dataset(dataset_id)
-            datasets.append(info_about_dataset)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            for info_about_dataset in tqdm(
+                executor.map(
+                    lambda dataset_id: get_data_for_dataset(
+                        dataset_id, session, base_url
+                    ),
+                    dataset_ids,
+                ),
+                total=dataset_count,
+            ):
+                datasets.append(info_about_dataset)
 
-            csv_count += 1
+                csv_count += 1
             # if csv_count == 10:
             # break
             """
@@ -143,12 +628,39 @@ def fetch_datasets(datset_list_name: str = None):
         # print(f"CSV COUNT: {csv_count}")
     else:
         print("Error fetching datasets")
+    session.close()
     print("================= DATASETS LIST FETCHING DONE =================")
     return datasets
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Download the datasets listed in dataset_download_list.json."
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="re-check every dataset with conditional requests and download "
+        f"only the changed ones, listing them in {CHANGED_DATASETS_PATH}",
+    )
+    parser.add_argument(
+        "--host-concurrency",
+        type=int,
+        default=HOST_CONCURRENCY,
+        help="parallel downloads per host",
+    )
+    parser.add_argument(
+        "--host-rate",
+        type=float,
+        default=HOST_RATE,
+        help="requests per second per host",
+    )
+    return parser.parse_args()
+
+
 # Main function
 def main():
+    args = parse_args()
     # datasets = fetch_datasets()  # To get group list of the site
     data_info = []
     dataset_download_list = []
@@ -193,33 +705,43 @@ def main():
     with open("dataset_download_list.json", "r") as f:
         dataset_download_list = json.load(f)
 
-    # Load existing data_info if it exists
-    data_info_path = Path("data_info.json")
-    if data_info_path.exists():
-        with open(data_info_path, "r") as f:
-            data_info = json.load(f)
-    else:
-        data_info = []
-
-    # Find the index to start from
-    start_index = len(data_info)
-    # start_index = 99
-
-    for item in tqdm(
-        dataset_download_list[start_index:],
-        initial=start_index,
+    # Resume from the download journal: every url already in it is done
+    seed_journal(dataset_download_list)
+    entries_by_url = read_journal()
+
+    if args.refresh:
+        changed = refresh_datasets(
+            dataset_download_list,
+            entries_by_url,
+            scheduler=DownloadScheduler(args.host_concurrency, args.host_rate),
+        )
+        data_info = compact_journal(dataset_download_list)
+        removed = prune_blobs(data_info)
+        if removed:
+            print(f"Removed {removed} files no dataset refers to anymore")
+        write_json_atomic(CHANGED_DATASETS_PATH, changed)
+        print(f"Refresh completed. Run analysis on {CHANGED_DATASETS_PATH}")
+        return
+
+    pending = [
+        item for item in dataset_download_list if item.get("url") not in entries_by_url
+    ]
+
+    scheduler = DownloadScheduler(args.host_concurrency, args.host_rate)
+    for item, download in tqdm(
+        scheduler.map(
+            pending,
+            lambda item: download_csv(item.get("url"), scheduler=scheduler),
+        ),
+        initial=len(dataset_download_list) - len(pending),
         total=len(dataset_download_list),
     ):
-        file_path = download_csv(item.get("url"))
-        if file_path:
-            data = {
-                "dataset_display_name": item.get("dataset_display_title"),
-                "dataset_file_name": file_path,
-            }
-            data_info.append(data)
-
+        if download:
+            data = dataset_entry(item, download)
             # Save progress after each successful download
-            data_info_path.write_text(json.dumps(data_info, indent=4) + "\n")
+            append_to_journal(data)
+
+    data_info = compact_journal(dataset_download_list)
 
     # pprint(data_info)
     # print(type(data_info))
@@ -0,0 +1,310 @@
+import argparse
+import functools
+import json
+import logging
+import os
+import queue
+import tempfile
+import threading
+from pprint import pprint
+
+from tqdm import tqdm
+
+import analysis
+import get_data
+
+DOWNLOAD_LIST_PATH = "dataset_download_list.json"
+REPORTS_PATH = "pipeline_reports.jsonl"
+QUEUE_SIZE = 16
+INDIVIDUAL_REPORT_PATH = "individual_dataset_analysis_report.json"
+COMBINED_REPORT_PATH = "combined_dataset_analysis_report.json"
+
+
+def read_reports(reports_path: str = REPORTS_PATH):
+    # Same append-only format as the download journal, one report per url
+    return get_data.read_journal(reports_path)
+
+
+def produce(
+    dataset_download_list: list,
+    entries_by_url: dict,
+    analyzed_urls: set,
+    ready: queue.Queue,
+    scheduler: get_data.DownloadScheduler = None,
+    journal_path: str = get_data.JOURNAL_PATH,
+):
+    # Files downloaded by an earlier run but not analyzed yet go first, then
+    # the pending urls are downloaded by the host scheduler, all hosts in
+    # parallel within their limits. Every finished download is journaled and
+    # put on the bounded ready queue; while the queue is full the scheduler is
+    # not resumed, so no new downloads are started. None marks the end.
+    scheduler = scheduler or get_data.default_scheduler()
+    try:
+        for item in dataset_download_list:
+            entry = entries_by_url.get(item.get("url"))
+            if (
+                entry
+                and entry.get("url") not in analyzed_urls
+                and os.path.isfile(entry.get("dataset_file_name") or "")
+            ):
+                ready.put(entry)
+
+        pending = [
+            item
+            for item in dataset_download_list
+            if item.get("url") not in entries_by_url
+        ]
+        for item, download in scheduler.map(
+            pending,
+            lambda item: get_data.download_csv(item["url"], scheduler=scheduler),
+        ):
+            if download:
+                entry = get_data.dataset_entry(item, download)
+                get_data.append_to_journal(entry, journal_path)
+                ready.put(entry)
+    finally:
+        ready.put(None)
+
+
+def failed_report(entry: dict, error: Exception):
+    return {
+        "dataset_name": entry.get("dataset_display_name"),
+        "dataset_file_path": entry.get("dataset_file_name"),
+        "analysis_results": [],
+        "error": str(error),
+    }
+
+
+def run_pipeline(
+    dataset_download_list: list,
+    analysis_instance=None,
+    executor_name: str = "thread",
+    workers: int = None,
+    scheduler: get_data.DownloadScheduler = None,
+    queue_size: int = QUEUE_SIZE,
+    cache=None,
+    reports_path: str = REPORTS_PATH,
+    journal_path: str = get_data.JOURNAL_PATH,
+    data_info_path: str = get_data.DATA_INFO_PATH,
+):
+    # Downloads and analyses overlap: a producer thread downloads, the main
+    # thread hands every downloaded file to the analysis pool as soon as a
+    # slot is free. Each report is appended to reports_path when it is done,
+    # so an interrupted run continues with the files that have no report for
+    # their current content yet.
+    analysis_instance = analysis_instance or analysis.Analysis()
+    get_data.seed_journal(dataset_download_list, data_info_path, journal_path)
+    entries_by_url = get_data.read_journal(journal_path)
+    reports_by_url = read_reports(reports_path)
+    analyzed_urls = {
+        url
+        for url, report in reports_by_url.items()
+        if url in entries_by_url
+        and report.get("sha256") == entries_by_url[url].get("sha256")
+    }
+
+    ready = queue.Queue(maxsize=queue_size)
+    producer = threading.Thread(
+        target=produce,
+        args=(
+            dataset_download_list,
+            entries_by_url,
+            analyzed_urls,
+            ready,
+            scheduler,
+            journal_path,
+        ),
+        daemon=True,
+    )
+    producer.start()
+
+    # At most one queued analysis per worker on top of the running ones, so
+    # the ready queue is what buffers finished downloads.
+    slots = threading.BoundedSemaphore(2 * (workers or os.cpu_count() or 1))
+    lock = threading.Lock()
+    progress = tqdm(
+        total=len(dataset_download_list),
+        initial=len(
+            analyzed_urls & {item.get("url") for item in dataset_download_list}
+        ),
+    )
+
+    # Every file content is analyzed once: entries whose content was already
+    # analyzed get a copy of that report, entries whose content is being
+    # analyzed wait for it.
+    reports_by_content = {
+        report["sha256"]: report
+        for url, report in reports_by_url.items()
+        if url in analyzed_urls and report.get("sha256")
+    }
+    in_flight = {}
+
+    def record(report, entry):
+        report["url"] = entry.get("url")
+        report["sha256"] = entry.get("sha256")
+        get_data.append_to_journal(report, reports_path)
+        reports_by_url[report["url"]] = report
+        progress.update()
+
+    def finish(future, key):
+        try:
+            with lock:
+                first, *others = in_flight.pop(key)
+                try:
+                    report = future.result()
+                except Exception as e:
+                    logging.error(
+                        f"Failed to analyze {first.get('dataset_file_name')}: {e}"
+                    )
+                    report = failed_report(first, e)
+                record(report, first)
+                reports_by_content[key] = report
+                for entry in others:
+                    record(analysis.shared_report(report, entry), entry)
+        finally:
+            slots.release()
+
+    with analysis.EXECUTORS[executor_name](max_workers=workers) as executor:
+        while True:
+            slots.acquire()
+            entry = ready.get()
+            if entry is None:
+                slots.release()
+                break
+            key = entry.get("sha256") or entry.get("url")
+            with lock:
+                if key in in_flight or key in reports_by_content:
+                    if key in in_flight:
+                        in_flight[key].append(entry)
+                    else:
+                        record(
+                            analysis.shared_report(reports_by_content[key], entry),
+                            entry,
+                        )
+                    slots.release()
+                    continue
+                in_flight[key] = [entry]
+            future = executor.submit(
+                analysis.process_dataset, entry, analysis_instance, cache
+            )
+            future.add_done_callback(functools.partial(finish, key=key))
+    producer.join()
+    progress.close()
+    if cache is not None:
+        cache.evict()
+    analysis_instance.evict_parsed_cache()
+
+    get_data.compact_journal(dataset_download_list, data_info_path, journal_path)
+    reports = [
+        reports_by_url[item["url"]]
+        for item in dataset_download_list
+        if item.get("url") in reports_by_url
+    ]
+    compact_reports(reports, reports_path)
+    return reports
+
+
+def compact_reports(reports: list, reports_path: str = REPORTS_PATH):
+    # Keep only the latest report per url, in download list order
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(reports_path) or ".", suffix=".tmp"
+    )
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        for report in reports:
+            f.write(json.dumps(report) + "\n")
+    get_data.apply_umask(temp_path)
+    os.replace(temp_path, reports_path)
+
+
+def write_reports(reports: list):
+    combined = analysis.CombinedSummary()
+    failed = []
+    for report in reports:
+        combined.add(report)
+        if "error" in report:
+            failed.append((report["dataset_name"], report["error"]))
+
+    with open(INDIVIDUAL_REPORT_PATH, "w") as f:
+        json.dump(reports, f, indent=4)
+    analysis.print_run_summary(combined, failed, INDIVIDUAL_REPORT_PATH)
+
+    combined_summary = combined.report()
+    pprint(combined_summary)
+    with open(COMBINED_REPORT_PATH, "w") as f:
+        json.dump(combined_summary, f, indent=4)
+    return combined_summary
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Download the datasets and analyze each one as soon as it "
+        "is downloaded."
+    )
+    parser.add_argument(
+        "download_list",
+        nargs="?",
+        default=DOWNLOAD_LIST_PATH,
+        help="path to the dataset download list json file",
+    )
+    parser.add_argument(
+        "--executor",
+        choices=sorted(analysis.EXECUTORS),
+        default="thread",
+        help="run the analyses in a thread pool or a process pool",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="number of analysis workers"
+    )
+    parser.add_argument(
+        "--host-concurrency",
+        type=int,
+        default=get_data.HOST_CONCURRENCY,
+        help="parallel downloads per host",
+    )
+    parser.add_argument(
+        "--host-rate",
+        type=float,
+        default=get_data.HOST_RATE,
+        help="requests per second per host",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=QUEUE_SIZE,
+        help="downloaded files waiting for analysis before downloads pause",
+    )
+    parser.add_argument(
+        "--reports",
+        default=REPORTS_PATH,
+        help="append-only report file used to resume an interrupted run",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="do not use the result cache"
+    )
+    parser.add_argument(
+        "--cache-dir", default=analysis.RESULT_CACHE_DIR, help="result cache directory"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    with open(args.download_list, "r") as f:
+        dataset_download_list = json.load(f)
+
+    cache = None if args.no_cache else analysis.ResultCache(args.cache_dir)
+    reports = run_pipeline(
+        dataset_download_list,
+        analysis.Analysis(),
+        args.executor,
+        args.workers,
+        get_data.DownloadScheduler(args.host_concurrency, args.host_rate),
+        args.queue_size,
+        cache,
+        args.reports,
+    )
+    write_reports(reports)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import get_data
+
+
+class StubServer:
+    # Local HTTP server whose responses come from `respond(handler)`, which
+    # returns (status, headers, body). Every request is recorded, and the
+    # number of requests in flight is tracked to check the host limits.
+    def __init__(self, respond):
+        self.respond = respond
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub.lock:
+                    stub.requests.append((time.monotonic(), self.path, self.headers))
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    status, headers, body = stub.respond(self)
+                finally:
+                    with stub.lock:
+                        stub.in_flight -= 1
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeTime:
+    # Clock that only moves when the scheduler sleeps
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class StubServerTestCase(unittest.TestCase):
+    def setUp(self):
+        # Downloads and journals go to a scratch directory; the scripts'
+        # progress output is kept out of the test output.
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(directory.name)
+        stdout = contextlib.redirect_stdout(io.StringIO())
+        stdout.__enter__()
+        self.addCleanup(stdout.__exit__, None, None, None)
+
+    def start_server(self, respond):
+        server = StubServer(respond)
+        self.addCleanup(server.close)
+        return server
+
+
+class DownloadSchedulerTest(StubServerTestCase):
+    def test_host_concurrency(self):
+        def respond(handler):
+            time.sleep(0.2)
+            return 200, {}, handler.path.encode()
+
+        servers = [self.start_server(respond) for _ in range(2)]
+        items = [
+            {"url": f"{server.url}/{position}.csv"}
+            for server in servers
+            for position in range(6)
+        ]
+        scheduler = get_data.DownloadScheduler(concurrency=2, rate=1000, burst=10)
+        results = list(
+            scheduler.map(
+                items,
+                lambda item: get_data.download_csv(
+                    item["url"], "datasets", scheduler=scheduler
+                ),
+            )
+        )
+
+        self.assertEqual(len(results), len(items))
+        self.assertTrue(all(download for _, download in results))
+        for server in servers:
+            self.assertEqual(len(server.requests), 6)
+            self.assertEqual(server.max_in_flight, 2)
+        # The second host is not held up by the first host's queue
+        first_requests = [server.requests[0][0] for server in servers]
+        self.assertLess(max(first_requests) - min(first_requests), 0.1)
+
+    def test_retry_after_pauses_host(self):
+        def respond(handler):
+            if len(server.requests) == 1:
+                return 429, {"Retry-After": "7"}, b""
+            return 200, {}, b"a,b\n1,2\n"
+
+        server = self.start_server(respond)
+        fake_time = FakeTime()
+        scheduler = get_data.DownloadScheduler(
+            concurrency=1,
+            rate=10,
+            backoff_base=1000,
+            sleep=fake_time.sleep,
+            clock=fake_time.clock,
+        )
+        download = scheduler.download(f"{server.url}/data.csv", "datasets")
+
+        self.assertIsNotNone(download)
+        self.assertEqual(len(server.requests), 2)
+        # The retry waits for Retry-After instead of the backoff, and the
+        # host is paused for that long
+        self.assertEqual(fake_time.sleeps, [0.0, 7.0, 0.0])
+        host = scheduler.host(server.url)
+        self.assertEqual(host.paused_until, 7.0)
+
+    def test_retries_give_up(self):
+        server = self.start_server(lambda handler: (503, {}, b""))
+        fake_time = FakeTime()
+        scheduler = get_data.DownloadScheduler(
+            max_retries=3, sleep=fake_time.sleep, clock=fake_time.clock
+        )
+
+        self.assertIsNone(scheduler.download(f"{server.url}/data.csv", "datasets"))
+        self.assertEqual(len(server.requests), 3)
+        self.assertEqual(os.listdir("datasets"), [])
+
+
+class RefreshTest(StubServerTestCase):
+    def test_not_modified(self):
+        versions = {"body": b"a,b\n1,2\n", "etag": '"v1"'}
+
+        def respond(handler):
+            if handler.headers.get("If-None-Match") == versions["etag"]:
+                return 304, {"ETag": versions["etag"]}, b""
+            return 200, {"ETag": versions["etag"]}, versions["body"]
+
+        server = self.start_server(respond)
+        scheduler = get_data.DownloadScheduler(rate=1000)
+        item = {"url": f"{server.url}/data.csv", "dataset_display_title": "data"}
+        entry = get_data.dataset_entry(
+            item, get_data.download_csv(item["url"], scheduler=scheduler)
+        )
+        entries_by_url = {item["url"]: entry}
+
+        changed = get_data.refresh_datasets(
+            [item], entries_by_url, "journal.jsonl", scheduler
+        )
+        self.assertEqual(changed, [])
+        self.assertEqual(server.requests[-1][2].get("If-None-Match"), '"v1"')
+        self.assertFalse(os.path.exists("journal.jsonl"))
+
+        versions.update(body=b"a,b\n3,4\n", etag='"v2"')
+        changed = get_data.refresh_datasets(
+            [item], entries_by_url, "journal.jsonl", scheduler
+        )
+        self.assertEqual(len(changed), 1)
+        self.assertNotEqual(changed[0]["sha256"], entry["sha256"])
+        self.assertEqual(changed[0]["etag"], '"v2"')
+        self.assertEqual(
+            get_data.read_journal("journal.jsonl"), {item["url"]: changed[0]}
+        )
+
+    def test_missing_file_is_downloaded_again(self):
+        server = self.start_server(
+            lambda handler: (
+                304 if handler.headers.get("If-None-Match") else 200,
+                {"ETag": '"v1"'},
+                b"" if handler.headers.get("If-None-Match") else b"a\n1\n",
+            )
+        )
+        scheduler = get_data.DownloadScheduler(rate=1000)
+        item = {"url": f"{server.url}/data.csv"}
+        entry = get_data.dataset_entry(
+            item, get_data.download_csv(item["url"], scheduler=scheduler)
+        )
+        os.remove(entry["dataset_file_name"])
+
+        changed = get_data.refresh_datasets(
+            [item], {item["url"]: entry}, "journal.jsonl", scheduler
+        )
+        self.assertIsNone(server.requests[-1][2].get("If-None-Match"))
+        self.assertEqual(changed, [])
+        self.assertTrue(os.path.isfile(entry["dataset_file_name"]))
+
+
+class FetchDatasetsTest(StubServerTestCase):
+    def test_crawl_order(self):
+        dataset_ids = ["a", "b", "c", "d", "e", "f"]
+        delays = {"a": 0.3, "b": 0.25, "c": 0.2, "d": 0.15, "e": 0.1, "f": 0.0}
+
+        def respond(handler):
+            url = urlparse(handler.path)
+            if url.path == "/api/3/action/group_list":
+                result = dataset_ids
+            else:
+                dataset_id = parse_qs(url.query)["id"][0]
+                time.sleep(delays[dataset_id])
+                result = {"name": dataset_id}
+            body = json.dumps({"success": True, "result": result}).encode()
+            return 200, {"Content-Type": "application/json"}, body
+
+        server = self.start_server(respond)
+        datasets = get_data.fetch_datasets(base_url=server.url, workers=4)
+
+        # Results keep the order of the dataset list, whichever finished first
+        self.assertEqual([dataset["name"] for dataset in datasets], dataset_ids)
+        self.assertEqual(len(server.requests), len(dataset_ids) + 1)
+        self.assertGreater(server.max_in_flight, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()